@@ -1,37 +1,157 @@
-from flask import Flask, jsonify
+from flask import Flask, jsonify, send_from_directory
 import os
+import time
 from dotenv import load_dotenv
-from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 from extensions import init_extensions
-from extensions import mongo
+from extensions import mongo, response_cache, user_cache
+from utils.compression import init_compression
+from utils.db import ping
+from utils.indexes import bootstrap_indexes
+from utils.mailer import start_dispatcher
+from utils.metrics import init_metrics
+from utils.ratelimit import RateLimited, check_limits, rate_limited
+from utils.search import ensure_search_index
+from utils.serialization import FastJSONProvider
+from utils.startup import StartupTimer, defer, init_deferred
+from utils.suggest import ensure_suggest_index
+from utils.trending import ensure_trending
+from commands import register_commands
 
 load_dotenv()
 
+# in-memory indexes STARTUP_WARMUP may list, each built with fn(app, db)
+WARMUPS = {"search": ensure_search_index, "trending": ensure_trending, "suggest": ensure_suggest_index}
+
+
 def create_app():
+    timer = StartupTimer()
     app = Flask(__name__)
+    app.extensions["startup"] = timer
 
     app.config["MONGO_URI"] = os.getenv("MONGO_URI")
     app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY")
+    # connection pool / routing; unset keys fall back to MONGO_URI options and driver defaults
+    app.config["MONGO_MAX_POOL_SIZE"] = os.getenv("MONGO_MAX_POOL_SIZE")
+    app.config["MONGO_MIN_POOL_SIZE"] = os.getenv("MONGO_MIN_POOL_SIZE")
+    app.config["MONGO_MAX_IDLE_TIME_MS"] = os.getenv("MONGO_MAX_IDLE_TIME_MS")
+    app.config["MONGO_WAIT_QUEUE_TIMEOUT_MS"] = os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS")
+    app.config["MONGO_CONNECT_TIMEOUT_MS"] = os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000")
+    app.config["MONGO_SERVER_SELECTION_TIMEOUT_MS"] = os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")
+    app.config["MONGO_SOCKET_TIMEOUT_MS"] = os.getenv("MONGO_SOCKET_TIMEOUT_MS")
+    app.config["MONGO_READ_PREFERENCE"] = os.getenv("MONGO_READ_PREFERENCE")  # client-wide, e.g. primaryPreferred
+    app.config["MONGO_WRITE_CONCERN"] = os.getenv("MONGO_WRITE_CONCERN")  # e.g. majority, 1
+    app.config["MONGO_WTIMEOUT_MS"] = os.getenv("MONGO_WTIMEOUT_MS")
+    # read-only endpoints only, see utils/db.py::read_db
+    app.config["MONGO_READS_PREFERENCE"] = os.getenv("MONGO_READS_PREFERENCE", "primary")
+    app.config["MONGO_READS_MAX_STALENESS"] = int(os.getenv("MONGO_READS_MAX_STALENESS", 90))
+    app.config["ENSURE_INDEXES"] = os.getenv("ENSURE_INDEXES", "1") == "1"
+    app.config["INDEX_AUDIT"] = os.getenv("INDEX_AUDIT", "off")  # off | warn | fail
+    # in-memory indexes to build right after fork instead of on the first request that needs them
+    app.config["STARTUP_WARMUP"] = [w.strip() for w in os.getenv("STARTUP_WARMUP", "").split(",") if w.strip()]
+    unknown = [w for w in app.config["STARTUP_WARMUP"] if w not in WARMUPS]
+    if unknown:
+        raise ValueError(f"STARTUP_WARMUP: unknown {', '.join(unknown)}; choose from {', '.join(WARMUPS)}")
+    app.config["CACHE_BACKEND_URL"] = os.getenv("CACHE_BACKEND_URL")  # unset | local | redis://...
+    app.config["USER_CACHE_SIZE"] = int(os.getenv("USER_CACHE_SIZE", 10000))
+    app.config["USER_CACHE_TTL"] = int(os.getenv("USER_CACHE_TTL", 300))
+    app.config["USER_CACHE_LOCAL_TTL"] = int(os.getenv("USER_CACHE_LOCAL_TTL", 10))
+    app.config["RESPONSE_CACHE_SIZE"] = int(os.getenv("RESPONSE_CACHE_SIZE", 2000))
+    app.config["RESPONSE_CACHE_TTL"] = int(os.getenv("RESPONSE_CACHE_TTL", 30))
+    app.config["BACKGROUND_WORKERS"] = int(os.getenv("BACKGROUND_WORKERS", 4))
+    app.config["BACKGROUND_TASKS_EAGER"] = os.getenv("BACKGROUND_TASKS_EAGER") == "1"
+    app.config["MAIL_TRANSPORT"] = os.getenv("MAIL_TRANSPORT", "sendgrid")  # sendgrid | console | memory
+    app.config["MAIL_WORKERS"] = int(os.getenv("MAIL_WORKERS", 2))
+    app.config["PASSWORD_HASH_METHOD"] = os.getenv("PASSWORD_HASH_METHOD", "scrypt")  # e.g. scrypt:32768:8:1, pbkdf2:sha256:600000
+    # hashing processes per worker; by default the CPUs are shared out across gunicorn's WEB_CONCURRENCY workers
+    hash_workers = max(1, (os.cpu_count() or 1) // max(1, int(os.getenv("WEB_CONCURRENCY", 1))))
+    app.config["PASSWORD_HASH_WORKERS"] = int(os.getenv("PASSWORD_HASH_WORKERS", hash_workers))
+    app.config["PASSWORD_HASH_MAX_INFLIGHT"] = int(
+        os.getenv("PASSWORD_HASH_MAX_INFLIGHT", 4 * max(1, app.config["PASSWORD_HASH_WORKERS"]))
+    )
+    app.config["SEARCH_INDEX_PATH"] = os.getenv("SEARCH_INDEX_PATH", os.path.join(app.root_path, "search_index.pkl"))
+    app.config["SEARCH_REBUILD_INTERVAL"] = int(os.getenv("SEARCH_REBUILD_INTERVAL", 3600))
+    app.config["TRENDING_SNAPSHOT_PATH"] = os.getenv("TRENDING_SNAPSHOT_PATH", os.path.join(app.root_path, "trending.pkl"))
+    app.config["TRENDING_REFRESH_INTERVAL"] = int(os.getenv("TRENDING_REFRESH_INTERVAL", 300))
+    app.config["TRENDING_DECAY_SECONDS"] = int(os.getenv("TRENDING_DECAY_SECONDS", 45000))
+    app.config["TRENDING_WINDOW_DAYS"] = int(os.getenv("TRENDING_WINDOW_DAYS", 7))
+    app.config["TIMELINE_LENGTH"] = int(os.getenv("TIMELINE_LENGTH", 800))
+    app.config["FANOUT_MAX_FOLLOWERS"] = int(os.getenv("FANOUT_MAX_FOLLOWERS", 10000))
+    app.config["IMAGE_BACKEND"] = os.getenv("IMAGE_BACKEND", "cloudinary")  # cloudinary | local
+    app.config["IMAGE_LOCAL_DIR"] = os.getenv("IMAGE_LOCAL_DIR", os.path.join(app.root_path, "media"))
+    app.config["RATELIMIT_ENABLED"] = os.getenv("RATELIMIT_ENABLED", "1") == "1"
+    app.config["RATELIMIT_STORAGE"] = os.getenv("RATELIMIT_STORAGE", "shared")  # shared (needs CACHE_BACKEND_URL) | local
+    # concurrent search_top requests per worker before the rest are shed with 429 (0 = unlimited)
+    app.config["RATELIMIT_SEARCH_INFLIGHT"] = int(os.getenv("RATELIMIT_SEARCH_INFLIGHT", 8))
+    # per-limit overrides, e.g. RATELIMIT_LOGIN_IP=50/minute
+    app.config.update({k: v for k, v in os.environ.items() if k.startswith("RATELIMIT_") and k not in app.config})
+    # proxies in front of the app whose X-Forwarded-For is trusted; 0 when clients connect directly.
+    # Behind a proxy without it every client shares the proxy's address, and its rate limit buckets
+    app.config["PROXY_FIX_X_FOR"] = int(os.getenv("PROXY_FIX_X_FOR", 0))
+    app.config["COMPRESS_ENABLED"] = os.getenv("COMPRESS_ENABLED", "1") == "1"  # off when a proxy compresses
+    app.config["COMPRESS_MIN_SIZE"] = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+    app.config["MONGO_SLOW_MS"] = int(os.getenv("MONGO_SLOW_MS", 100))
+    app.config["SERVER_TIMING"] = os.getenv("SERVER_TIMING") == "1"
 
-    # Enable CORS for frontend (Vercel)
-    CORS(app)
+    check_limits(app.config)
+    if app.config["PROXY_FIX_X_FOR"]:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config["PROXY_FIX_X_FOR"])
 
-    init_extensions(app)
+    # no network I/O from here on: see utils/startup.py
+    with timer.phase("extensions"):
+        init_extensions(app)
+    # orjson-backed; encodes ObjectId and datetime (ISO 8601, UTC) everywhere.
+    # Set after init_extensions: Flask-PyMongo's init_app installs its own BSON provider
+    app.json = FastJSONProvider(app)
+    init_metrics(app)
+    init_compression(app)
+    init_deferred(app)
 
-    print("DEBUG: mongo after init ->", type(mongo), getattr(mongo, "db", None))
+    if mongo.db is not None:
+        if (app.config["INDEX_AUDIT"] or "").lower() == "fail":
+            # a failing audit has to stop startup, so this one can't wait for a worker
+            with timer.phase("indexes"):
+                bootstrap_indexes(app, mongo.db)
+        else:
+            defer(app, bootstrap_indexes)
+        # drain whatever the outbox still holds from before this process started
+        defer(app, start_dispatcher)
+        for name in app.config["STARTUP_WARMUP"]:
+            defer(app, WARMUPS[name])
 
-    from blueprints.auth import auth_bp
-    from blueprints.posts import posts_bp
+    with timer.phase("blueprints"):
+        from blueprints.auth import auth_bp
+        from blueprints.posts import posts_bp
+        from blueprints.users import users_bp
 
     app.register_blueprint(auth_bp, url_prefix="/api/auth")
     app.register_blueprint(posts_bp, url_prefix="/api/posts")
+    app.register_blueprint(users_bp, url_prefix="/api/users")
+
+    register_commands(app)
+    app.register_error_handler(RateLimited, rate_limited)
+
+    if app.config["IMAGE_BACKEND"] == "local":
+        # serve the local image stand-in's files
+        @app.route("/api/media/<path:filename>")
+        def media(filename):
+            return send_from_directory(app.config["IMAGE_LOCAL_DIR"], filename)
 
-    # Health check endpoint
+    # Readiness probe: 503 until the pool can reach the database
     @app.route("/api/health")
     def health():
-        return jsonify({"status": "OK"})
+        caches = {"users": user_cache.stats(), "responses": response_cache.stats()}
+        started = time.perf_counter()
+        try:
+            ping()
+        except Exception as e:
+            app.logger.warning("health check ping failed: %s", e)
+            return jsonify({"status": "unavailable", "mongo": {"ok": False, "error": str(e)}, "caches": caches}), 503
+        ping_ms = round((time.perf_counter() - started) * 1000, 2)
+        return jsonify({"status": "OK", "mongo": {"ok": True, "ping_ms": ping_ms}, "caches": caches})
 
+    app.logger.info("app created in %s", timer.summary())
     return app
 
 
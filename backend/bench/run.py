@@ -0,0 +1,480 @@
+# backend/bench/run.py
+"""
+Load benchmark for every API route.
+
+Seeds a throwaway database, then drives each scenario through the Flask app
+with N concurrent test clients and prints one JSON document: throughput,
+latency percentiles and Mongo queries/DB time per request (read from the
+Server-Timing header, see utils/metrics.py). Save the output per commit and
+diff two runs with --compare.
+
+    cd backend
+    python -m bench.run --mongo-uri mongodb://localhost/blog_bench --out before.json
+    python -m bench.run --mongo-uri ... --compare before.json --out after.json
+    python -m bench.run --mongomock --requests 20          # smoke test, no server
+
+A real (local) MongoDB is required for numbers worth comparing; the target
+database is wiped, so its name must contain "bench". --mongomock is a smoke
+test only: no command monitoring (query counts are null), one client at a
+time (mongomock is not thread-safe), and background fan-out fails on bulk
+updates from recent pymongo (logged, not counted).
+
+Responses outside 2xx/3xx are counted as failures and left out of the
+latency figures; any failure makes the run exit 1.
+"""
+import argparse
+import datetime
+import json
+import math
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urlparse
+
+from bson.objectid import ObjectId
+
+from bench.seed import BENCH_PASSWORD, BENCH_RESET_TOKEN, reset_token_hash, seed
+
+SERVER_TIMING_RE = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+
+
+## SETUP
+
+def make_app(mongo_uri):
+    # must be set before app.py is imported: it builds the app at import time
+    os.environ.update({
+        "MONGO_URI": mongo_uri or "mongodb://localhost:27017/blog_bench",
+        "JWT_SECRET_KEY": os.getenv("JWT_SECRET_KEY", "bench-secret"),
+        # created below instead, so the first timed requests don't race the post-fork bootstrap
+        "ENSURE_INDEXES": "0",
+        "MAIL_TRANSPORT": "memory",
+        "IMAGE_BACKEND": "local",
+        "SEARCH_INDEX_PATH": "",
+        "TRENDING_SNAPSHOT_PATH": "",
+        "SERVER_TIMING": "1",
+        # every bench client shares one IP
+        "RATELIMIT_ENABLED": "0",
+    })
+    from app import app
+    from extensions import mongo
+
+    backend = "mongodb"
+    if not mongo_uri:
+        import mongomock
+        mongo.cx = mongomock.MongoClient()
+        mongo.db = mongo.cx.blog_bench
+        backend = "mongomock"
+    elif "bench" not in (urlparse(mongo_uri).path or ""):
+        sys.exit("refusing to wipe a database whose name does not contain 'bench'")
+    else:
+        from utils.indexes import ensure_indexes
+        ensure_indexes(mongo.db, app.logger)
+    return app, mongo.db, backend
+
+
+class Context:
+    """Seeded ids plus per-user access tokens, shared by every scenario."""
+
+    def __init__(self, app, db, data):
+        from flask_jwt_extended import create_access_token
+        self.app = app
+        self.db = db
+        self.data = data
+        with app.app_context():
+            self.tokens = {uid: create_access_token(identity=uid) for uid in data["users"]}
+        self._lock = threading.Lock()
+        self._next_user = 0
+
+    def auth(self, user_id):
+        return {"Authorization": f"Bearer {self.tokens[user_id]}"}
+
+    def take_user(self):
+        """Hand out users round-robin, for scenarios that mutate per-user state."""
+        with self._lock:
+            i = self._next_user
+            self._next_user = (i + 1) % len(self.data["users"])
+        return i
+
+
+## SCENARIOS
+# Each build(ctx, rng) does any untimed setup and returns the request kwargs
+# (path, json, headers; "method" overrides the scenario default).
+
+def _register(ctx, rng):
+    email = f"new-{uuid.uuid4().hex}@example.com"
+    return {"path": "/api/auth/register", "json": {"username": "newbie", "email": email, "password": BENCH_PASSWORD}}
+
+
+def _login(ctx, rng):
+    return {"path": "/api/auth/login", "json": {"email": rng.choice(ctx.data["emails"]), "password": BENCH_PASSWORD}}
+
+
+def _me(ctx, rng):
+    return {"path": "/api/auth/me", "headers": ctx.auth(rng.choice(ctx.data["users"]))}
+
+
+def _request_reset(ctx, rng):
+    return {"path": "/api/auth/request_reset", "json": {"email": rng.choice(ctx.data["emails"])}}
+
+
+def _reset_password(ctx, rng):
+    i = ctx.take_user()
+    ctx.db.users.update_one({"email": ctx.data["emails"][i]}, {"$set": {
+        "reset_password_token": reset_token_hash(),
+        "reset_password_expires": datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1),
+    }})
+    return {"path": "/api/auth/reset-password", "json": {
+        "email": ctx.data["emails"][i], "token": BENCH_RESET_TOKEN, "password": BENCH_PASSWORD,
+    }}
+
+
+def _create_post(ctx, rng):
+    body = " ".join(rng.choice(ctx.data["search_terms"]) for _ in range(300))
+    return {"path": "/api/posts/", "headers": ctx.auth(rng.choice(ctx.data["users"])), "json": {
+        "title": f"Bench post {uuid.uuid4().hex[:8]}", "body": body, "tags": ["python", "performance"],
+    }}
+
+
+def _list_posts(ctx, rng):
+    return {"path": "/api/posts/?per_page=10"}
+
+
+def _list_posts_auth(ctx, rng):
+    return {"path": "/api/posts/?per_page=10", "headers": ctx.auth(rng.choice(ctx.data["users"]))}
+
+
+def _list_posts_deep(ctx, rng):
+    # legacy offset paging deep into the feed
+    return {"path": f"/api/posts/?page={rng.randint(20, 100)}&per_page=10"}
+
+
+def _list_posts_cursor(ctx, rng):
+    from utils.pagination import encode_cursor
+    post_id = rng.choice(ctx.data["posts"])
+    token = encode_cursor(ctx.data["created_at"][post_id], post_id)
+    return {"path": f"/api/posts/?per_page=10&cursor={token}"}
+
+
+def _get_post(ctx, rng):
+    return {"path": f"/api/posts/{rng.choice(ctx.data['posts'])}"}
+
+
+def _get_hot_post_auth(ctx, rng):
+    return {"path": f"/api/posts/{rng.choice(ctx.data['hot_posts'])}", "headers": ctx.auth(rng.choice(ctx.data["users"]))}
+
+
+def _get_posts_batch(ctx, rng):
+    ids = rng.sample(ctx.data["posts"], 20)
+    return {"path": f"/api/posts/batch?ids={','.join(ids)}", "headers": ctx.auth(rng.choice(ctx.data["users"]))}
+
+
+def _bulk_import(ctx, rng):
+    posts = [{
+        "title": f"Imported {uuid.uuid4().hex[:8]}",
+        "body": " ".join(rng.choice(ctx.data["search_terms"]) for _ in range(300)),
+        "tags": ["python"],
+    } for _ in range(50)]
+    return {"path": "/api/posts/bulk", "headers": ctx.auth(rng.choice(ctx.data["users"])), "json": {"posts": posts}}
+
+
+def _update_post(ctx, rng):
+    post_id = rng.choice(ctx.data["posts"][len(ctx.data["hot_posts"]):])
+    return {"path": f"/api/posts/{post_id}", "headers": ctx.auth(ctx.data["authors"][post_id]),
+            "json": {"title": f"Edited {uuid.uuid4().hex[:8]}"}}
+
+
+def _delete_post(ctx, rng):
+    user_id = rng.choice(ctx.data["users"])
+    res = ctx.db.posts.insert_one({
+        "title": "doomed", "body": "to be deleted", "author_id": user_id, "tags": [], "image": None,
+        "created_at": datetime.datetime.utcnow(), "updated_at": None, "likes_count": 0, "comments_count": 0,
+    })
+    return {"path": f"/api/posts/{res.inserted_id}", "headers": ctx.auth(user_id)}
+
+
+def _search(ctx, rng):
+    q = " ".join(rng.sample(ctx.data["search_terms"], 2))
+    return {"path": f"/api/posts/search_top?q={quote(q)}&limit=10"}
+
+
+def _suggest(ctx, rng):
+    return {"path": f"/api/posts/suggest?prefix={rng.choice(ctx.data['prefixes'])}"}
+
+
+def _trending(ctx, rng):
+    return {"path": "/api/posts/trending?limit=20"}
+
+
+def _add_comment(ctx, rng):
+    return {"path": f"/api/posts/{rng.choice(ctx.data['hot_posts'])}/comments",
+            "headers": ctx.auth(rng.choice(ctx.data["users"])), "json": {"body": "bench comment"}}
+
+
+def _get_comments(ctx, rng):
+    return {"path": f"/api/posts/{rng.choice(ctx.data['hot_posts'])}/comments?limit=20"}
+
+
+def _stream_comments(ctx, rng):
+    return {"path": f"/api/posts/{rng.choice(ctx.data['hot_posts'])}/comments?stream=1"}
+
+
+def _delete_comment(ctx, rng):
+    user_id = rng.choice(ctx.data["users"])
+    post_id = rng.choice(ctx.data["posts"])
+    oid = ObjectId(post_id)
+    res = ctx.db.comments.insert_one({
+        "post_id": oid, "author_id": user_id, "body": "doomed", "created_at": datetime.datetime.utcnow(),
+    })
+    ctx.db.posts.update_one({"_id": oid}, {"$inc": {"comments_count": 1}})
+    return {"path": f"/api/posts/{post_id}/comments/{res.inserted_id}", "headers": ctx.auth(user_id)}
+
+
+def _follow_toggle(ctx, rng):
+    me, other = rng.sample(ctx.data["users"], 2)
+    method = "POST" if rng.random() < 0.5 else "DELETE"
+    return {"path": f"/api/users/{other}/follow", "method": method, "headers": ctx.auth(me)}
+
+
+def _home_feed(ctx, rng):
+    return {"path": "/api/users/feed?per_page=10", "headers": ctx.auth(rng.choice(ctx.data["users"]))}
+
+
+def _toggle_like(ctx, rng):
+    return {"path": f"/api/posts/{rng.choice(ctx.data['hot_posts'])}/like",
+            "headers": ctx.auth(rng.choice(ctx.data["users"]))}
+
+
+SCENARIOS = [
+    # name, method, build
+    ("auth.register", "POST", _register),
+    ("auth.login", "POST", _login),
+    ("auth.me", "GET", _me),
+    ("auth.request_reset", "POST", _request_reset),
+    ("auth.reset_password", "POST", _reset_password),
+    ("posts.create", "POST", _create_post),
+    ("posts.list", "GET", _list_posts),
+    ("posts.list_auth", "GET", _list_posts_auth),
+    ("posts.list_deep_page", "GET", _list_posts_deep),
+    ("posts.list_cursor", "GET", _list_posts_cursor),
+    ("posts.get", "GET", _get_post),
+    ("posts.get_hot_auth", "GET", _get_hot_post_auth),
+    ("posts.get_batch", "GET", _get_posts_batch),
+    ("posts.bulk_import", "POST", _bulk_import),
+    ("posts.update", "PUT", _update_post),
+    ("posts.delete", "DELETE", _delete_post),
+    ("posts.search_top", "GET", _search),
+    ("posts.suggest", "GET", _suggest),
+    ("posts.trending", "GET", _trending),
+    ("posts.add_comment", "POST", _add_comment),
+    ("posts.get_comments", "GET", _get_comments),
+    ("posts.stream_comments", "GET", _stream_comments),
+    ("posts.delete_comment", "DELETE", _delete_comment),
+    ("posts.toggle_like", "POST", _toggle_like),
+    ("users.follow_unfollow", "POST", _follow_toggle),
+    ("users.feed", "GET", _home_feed),
+]
+
+
+## RUNNER
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    k = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def _client_loop(ctx, method, build, n, seed_value, samples):
+    rng = random.Random(seed_value)
+    client = ctx.app.test_client()
+    for _ in range(n):
+        kwargs = {"method": method, **build(ctx, rng)}
+        started = time.perf_counter()
+        resp = client.open(**kwargs)
+        resp.get_data()  # drain streamed bodies inside the timing
+        elapsed = time.perf_counter() - started
+        timing = SERVER_TIMING_RE.search(resp.headers.get("Server-Timing", ""))
+        samples.append((
+            elapsed, resp.status_code,
+            int(timing.group(2)) if timing else None,
+            float(timing.group(1)) if timing else None,
+            resp.headers.get("X-Cache"),
+        ))
+        resp.close()
+
+
+def run_scenario(ctx, name, method, build, requests, concurrency, warmup, count_queries):
+    # warm-up requests build in-memory indexes and caches; they are not measured
+    _client_loop(ctx, method, build, warmup, f"{name}:warmup", [])
+
+    samples = []
+    per_client = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [
+            pool.submit(_client_loop, ctx, method, build, n, f"{name}:{i}", samples)
+            for i, n in enumerate(per_client) if n
+        ]
+        for f in futures:
+            f.result()
+    wall = time.perf_counter() - started
+
+    ok = [s for s in samples if s[1] < 400]
+    latencies = sorted(s[0] * 1000 for s in ok)
+    statuses = {}
+    for s in samples:
+        statuses[str(s[1])] = statuses.get(str(s[1]), 0) + 1
+    queries = sorted(s[2] for s in ok if s[2] is not None)
+    db_ms = [s[3] for s in ok if s[3] is not None]
+    cached = [s[4] for s in ok if s[4]]
+
+    result = {
+        "method": method,
+        "requests": len(samples),
+        "failures": len(samples) - len(ok),
+        "status": statuses,
+        "throughput_rps": round(len(ok) / wall, 2) if wall else None,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 3) if latencies else None,
+            "p50": round(_percentile(latencies, 50), 3) if latencies else None,
+            "p95": round(_percentile(latencies, 95), 3) if latencies else None,
+            "p99": round(_percentile(latencies, 99), 3) if latencies else None,
+            "max": round(latencies[-1], 3) if latencies else None,
+        },
+        "queries_per_request": None,
+        "db_ms_per_request": None,
+        "cache_hit_ratio": round(cached.count("HIT") / len(cached), 3) if cached else None,
+    }
+    if count_queries and queries:
+        result["queries_per_request"] = {
+            "mean": round(sum(queries) / len(queries), 2),
+            "p95": _percentile(queries, 95),
+            "max": queries[-1],
+        }
+        result["db_ms_per_request"] = round(sum(db_ms) / len(db_ms), 3)
+    return result
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def compare(baseline, current, out=sys.stderr):
+    """Print p50/p95/throughput/queries deltas for routes present in both runs."""
+    print(f"{'route':28} {'p50 ms':>18} {'p95 ms':>18} {'rps':>18} {'queries':>12}", file=out)
+    for name, now in current["routes"].items():
+        before = baseline.get("routes", {}).get(name)
+        if not before:
+            continue
+
+        def cell(a, b):
+            if a is None or b is None:
+                return "-"
+            change = f"{(b - a) / a * 100:+.0f}%" if a else ""
+            return f"{a:g}->{b:g} {change}"
+
+        q_before = (before.get("queries_per_request") or {}).get("mean")
+        q_now = (now.get("queries_per_request") or {}).get("mean")
+        print(
+            f"{name:28} {cell(before['latency_ms']['p50'], now['latency_ms']['p50']):>18} "
+            f"{cell(before['latency_ms']['p95'], now['latency_ms']['p95']):>18} "
+            f"{cell(before['throughput_rps'], now['throughput_rps']):>18} "
+            f"{cell(q_before, q_now):>12}",
+            file=out,
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", default=os.getenv("BENCH_MONGO_URI"), help="MongoDB to wipe and seed")
+    parser.add_argument("--mongomock", action="store_true", help="smoke test against mongomock instead")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--posts", type=int, default=2000)
+    parser.add_argument("--hot-posts", type=int, default=5)
+    parser.add_argument("--body-words", type=int, default=800)
+    parser.add_argument("--hot-likes", type=int, default=150)
+    parser.add_argument("--hot-comments", type=int, default=2000)
+    parser.add_argument("--follows-per-user", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--only", help="comma separated scenario name prefixes, e.g. posts.list,auth.login")
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="earlier JSON report to print deltas against")
+    args = parser.parse_args(argv)
+    if not args.mongo_uri and not args.mongomock:
+        parser.error("--mongo-uri (or BENCH_MONGO_URI) is required; use --mongomock for a smoke test")
+    if args.mongomock:
+        args.mongo_uri = None
+        args.concurrency = 1
+
+    app, db, backend = make_app(args.mongo_uri)
+    from werkzeug.security import generate_password_hash
+    password_hash = generate_password_hash(BENCH_PASSWORD, app.config["PASSWORD_HASH_METHOD"])
+    dataset = {
+        "users": args.users, "posts": args.posts, "hot_posts": args.hot_posts, "body_words": args.body_words,
+        "hot_likes": args.hot_likes, "hot_comments": args.hot_comments,
+        "follows_per_user": args.follows_per_user, "random_seed": args.seed,
+    }
+    t0 = time.perf_counter()
+    data = seed(db, password_hash, **dataset)
+    seed_seconds = time.perf_counter() - t0
+    ctx = Context(app, db, data)
+
+    only = [p.strip() for p in args.only.split(",")] if args.only else None
+    routes = {}
+    for name, method, build in SCENARIOS:
+        if only and not any(name.startswith(p) for p in only):
+            continue
+        print(f"running {name} ...", file=sys.stderr)
+        routes[name] = run_scenario(
+            ctx, name, method, build, args.requests, args.concurrency, args.warmup,
+            count_queries=backend == "mongodb",
+        )
+
+    report = {
+        "meta": {
+            "revision": _git_revision(),
+            "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "backend": backend,
+            "dataset": dataset,
+            "seed_seconds": round(seed_seconds, 2),
+            "requests_per_scenario": args.requests,
+            "concurrency": args.concurrency,
+            "password_hash_method": app.config["PASSWORD_HASH_METHOD"],
+        },
+        "routes": routes,
+    }
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+    failed = {name: r["status"] for name, r in routes.items() if r["failures"]}
+    if failed:
+        for name, statuses in failed.items():
+            print(f"FAILED {name}: {statuses}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
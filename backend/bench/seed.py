@@ -0,0 +1,140 @@
+# backend/bench/seed.py
+# Deterministic synthetic dataset for the benchmark harness (bench/run.py).
+import datetime
+import hashlib
+import random
+
+from bson.objectid import ObjectId
+
+from utils.text import derived_fields
+
+BENCH_PASSWORD = "bench-password"
+BENCH_RESET_TOKEN = "bench-reset-token"
+BATCH = 1000
+
+# a few real words so search/suggest scenarios have something to match
+COMMON_WORDS = (
+    "python flask mongo index query cache latency database design react nextjs deploy "
+    "docker kubernetes testing security performance async thread process memory network "
+    "search ranking feed comments likes profile image upload worker queue metrics"
+).split()
+TAGS = ["python", "flask", "mongodb", "react", "devops", "security", "performance", "design", "career", "testing"]
+
+
+def _vocabulary(rng, size=3000):
+    syllables = ["ka", "lo", "mi", "ne", "ru", "ta", "vo", "shi", "pre", "con", "ber", "dal", "ex", "ion", "ly"]
+    words = set(COMMON_WORDS)
+    while len(words) < size:
+        words.add("".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def reset_token_hash():
+    return hashlib.sha256(BENCH_RESET_TOKEN.encode("utf-8")).hexdigest()
+
+
+def _insert(collection, docs):
+    for i in range(0, len(docs), BATCH):
+        collection.insert_many(docs[i:i + BATCH], ordered=False)
+
+
+def seed(db, password_hash, users=200, posts=2000, hot_posts=5, body_words=800,
+         hot_likes=150, hot_comments=2000, follows_per_user=20, timeline_length=800, random_seed=42):
+    """
+    Drop and refill users, posts, likes and comments. Returns a dict of the
+    ids the scenarios need (users, posts, hot posts, search terms, ...).
+
+    Every user shares password_hash (for BENCH_PASSWORD) so seeding does not
+    pay the hashing cost per user. hot_posts get hot_likes likes (capped at the
+    number of users) and hot_comments comments each; the rest get a handful.
+    Each user follows follows_per_user others, with home timelines
+    materialized the way fan-out on write would have left them.
+    """
+    rng = random.Random(random_seed)
+    vocab = _vocabulary(rng)
+    for name in ("users", "posts", "likes", "comments", "mail_outbox", "follows", "timelines"):
+        db[name].delete_many({})
+
+    now = datetime.datetime.utcnow()
+    user_docs = [{
+        "_id": ObjectId(),
+        "username": f"bench{i}",
+        "email": f"bench{i}@example.com",
+        "password": password_hash,
+        "created_at": now - datetime.timedelta(days=365),
+    } for i in range(users)]
+    _insert(db.users, user_docs)
+    user_ids = [str(u["_id"]) for u in user_docs]
+
+    post_docs = []
+    for i in range(posts):
+        body = " ".join(rng.choice(vocab) for _ in range(rng.randint(body_words // 2, body_words)))
+        post_docs.append({
+            "_id": ObjectId(),
+            "title": " ".join(rng.choice(vocab) for _ in range(rng.randint(3, 8))).capitalize(),
+            "body": body,
+            "author_id": rng.choice(user_ids),
+            "tags": rng.sample(TAGS, rng.randint(0, 3)),
+            "image": None,
+            # newest first; one post every ten minutes going back
+            "created_at": now - datetime.timedelta(minutes=10 * i),
+            "updated_at": None,
+            "likes_count": 0,
+            "comments_count": 0,
+            **derived_fields(body),
+        })
+
+    hot = post_docs[:hot_posts]
+    likes, comments = [], []
+    for i, post in enumerate(post_docs):
+        is_hot = i < hot_posts
+        n_likes = min(hot_likes if is_hot else rng.randint(0, 5), users)
+        n_comments = hot_comments if is_hot else rng.randint(0, 3)
+        for uid in rng.sample(user_ids, n_likes):
+            likes.append({"post_id": post["_id"], "user_id": uid, "created_at": post["created_at"]})
+        for j in range(n_comments):
+            comments.append({
+                "post_id": post["_id"],
+                "author_id": rng.choice(user_ids),
+                "body": " ".join(rng.choice(vocab) for _ in range(rng.randint(5, 40))),
+                "created_at": post["created_at"] + datetime.timedelta(seconds=j + 1),
+            })
+        post["likes_count"] = n_likes
+        post["comments_count"] = n_comments
+
+    _insert(db.posts, post_docs)
+    _insert(db.likes, likes)
+    _insert(db.comments, comments)
+
+    by_author = {}
+    for post in post_docs:  # already newest first
+        by_author.setdefault(post["author_id"], []).append(
+            {"post_id": post["_id"], "author_id": post["author_id"], "created_at": post["created_at"]}
+        )
+    follows, timelines = [], []
+    followers_count = dict.fromkeys(user_ids, 0)
+    for uid in user_ids:
+        followees = rng.sample([u for u in user_ids if u != uid], min(follows_per_user, users - 1))
+        for fid in followees:
+            follows.append({"follower_id": uid, "followee_id": fid, "created_at": now})
+            followers_count[fid] += 1
+        entries = [e for a in followees + [uid] for e in by_author.get(a, [])]
+        entries.sort(key=lambda e: (e["created_at"], e["post_id"]), reverse=True)
+        timelines.append({"_id": uid, "entries": entries[:timeline_length], "updated_at": now})
+    _insert(db.follows, follows)
+    _insert(db.timelines, timelines)
+    for u in user_docs:
+        db.users.update_one({"_id": u["_id"]}, {"$set": {
+            "followers_count": followers_count[str(u["_id"])], "following_count": min(follows_per_user, users - 1),
+        }})
+
+    return {
+        "users": user_ids,
+        "emails": [u["email"] for u in user_docs],
+        "posts": [str(p["_id"]) for p in post_docs],
+        "authors": {str(p["_id"]): p["author_id"] for p in post_docs},
+        "hot_posts": [str(p["_id"]) for p in hot],
+        "search_terms": COMMON_WORDS + rng.sample(vocab, 50),
+        "prefixes": sorted({w[:3] for w in COMMON_WORDS + TAGS}),
+        "created_at": {str(p["_id"]): p["created_at"] for p in post_docs},
+    }
@@ -1,20 +1,22 @@
 from flask import Blueprint,request,jsonify,current_app
 from extensions import mongo
-from werkzeug.security import generate_password_hash, check_password_hash
+from utils.authors import get_profile, invalidate_user
+from utils import mailer, tasks
+from utils.ratelimit import rate_limit
+from utils.security import hash_password, needs_rehash, verify_password
 from flask_jwt_extended import create_access_token,jwt_required,get_jwt_identity
+from pymongo.errors import DuplicateKeyError
 import datetime
-from bson.objectid import ObjectId
 import hashlib
 import hmac
 import secrets
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
 import os
 
 auth_bp = Blueprint("auth",__name__)
 
 ##REGISTER 
 @auth_bp.route("/register",methods=["POST"])
+@rate_limit("register", ip="10/minute")
 def register():
     data = request.get_json() or {}
     username = data.get("username")
@@ -27,17 +29,22 @@ def register():
     if users.find_one({"email": email}):
         return jsonify({"msg": "email already registered"}), 400
     
-    hashed = generate_password_hash(password)
-    res = users.insert_one({
-        "username": username,
-        "email": email,
-        "password": hashed,
-        "created_at": datetime.datetime.now()
-    })
+    hashed = hash_password(password)
+    try:
+        res = users.insert_one({
+            "username": username,
+            "email": email,
+            "password": hashed,
+            "created_at": datetime.datetime.now()
+        })
+    except DuplicateKeyError:
+        # lost a race with a concurrent registration; the unique email index caught it
+        return jsonify({"msg": "email already registered"}), 400
     return jsonify({"msg":"user created", "user_id": str(res.inserted_id)}),201
 
 ##LOGIN
 @auth_bp.route("/login", methods=["POST"])
+@rate_limit("login", ip="30/minute", email="10/minute")
 def login():
     data = request.get_json() or {}
     email = data.get("email")
@@ -47,9 +54,13 @@ def login():
 
     users = mongo.db.users
     user = users.find_one({"email": email})
-    if not user or not check_password_hash(user.get("password",""), password):
+    if not user or not verify_password(user.get("password",""), password):
         return jsonify({"msg": "invalid credentials"}), 401
 
+    # Upgrade hashes made with old parameters while we still have the plaintext
+    if needs_rehash(user.get("password")):
+        tasks.submit(_rehash_password, user["_id"], user["password"], password)
+
     access_token = create_access_token(identity=str(user["_id"]))
     return jsonify({
         "access_token": access_token,
@@ -61,14 +72,22 @@ def login():
 @jwt_required()
 def me():
     uid = get_jwt_identity()
-    user = mongo.db.users.find_one({"_id": ObjectId(uid)}, {"password": 0})
-    if not user:
+    profile = get_profile(uid)
+    if not profile:
         return jsonify({"msg": "not found"}), 404
-    user["id"] = str(user["_id"])
-    user.pop("_id", None)
+    # cached profiles are shared; copy before adding fields
+    user = dict(profile)
+    user["id"] = str(uid)
     return jsonify(user)
 
 
+def _rehash_password(user_id, old_hash:str, password:str):
+    # conditional on old_hash so a concurrent password reset wins
+    mongo.db.users.update_one(
+        {"_id": user_id, "password": old_hash},
+        {"$set": {"password": hash_password(password)}}
+    )
+
 def _hash_token(raw_token:str)->str:
     return hashlib.sha256(raw_token.encode("utf-8")).hexdigest()
 
@@ -83,20 +102,8 @@ def _not_utc():
 
 ##THIS IS WHERE EMAIL IS GET TRIGGERED
 
-def send_reset_email_sendgrid(to_email:str,reset_url:str,user_name:str=""):
-    api_key=os.getenv("SENDGRID_API_KEY")
-    from_email = os.getenv("FROM_EMAIL")
-    from_name = os.getenv("FROM_NAME")
-    template_id = os.getenv("SENDGRID_TEMPLATE_RESET_ID")
-
-    if not api_key:
-        print("⚠️ Missing SendGrid API key or template ID")
-        print("Reset link:", reset_url)
-        current_app.logger.warning("SENDGRID_API_KEY not set. Reset URL: %s", reset_url)
-        return jsonify({"msg":"problem in sendgrid api env variables"})
-    
-    
-    html_content = f"""
+def reset_email_html(reset_url:str)->str:
+    return f"""
     <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px;">
         <h2 style="color: #333;">Reset Your Password</h2>
         <p>We received a request to reset your password. Click the button below to choose a new password.</p>
@@ -109,27 +116,19 @@ def send_reset_email_sendgrid(to_email:str,reset_url:str,user_name:str=""):
     </div>
     """
 
-    message = Mail(
-        from_email=(from_email, from_name),
-        to_emails=to_email,
-        subject="Reset Your Password",
-        html_content=html_content
+def send_reset_email(to_email:str,reset_url:str):
+    # Written to the outbox and sent by the background dispatcher (utils/mailer.py).
+    # Repeated requests collapse into one pending message carrying the newest link.
+    mailer.enqueue(
+        to_email,
+        "Reset Your Password",
+        reset_email_html(reset_url),
+        kind="reset_password",
+        dedupe_key=f"reset_password:{to_email}",
     )
 
-    # message.template_id = template_id
-    # message.dynamic_template_data = {
-    #     "user_name": user_name or to_email.split("@")[0].capitalize(),
-    #     "reset_url": reset_url,
-    # }
-
-    try:
-        sg=SendGridAPIClient(api_key)
-        resp=sg.send(message)
-        current_app.logger.info("SendGrid response: status=%s", resp.status_code)
-    except Exception as e:
-        current_app.logger.exception("SendGrid send failed: %s", e)
-
 @auth_bp.route("/request_reset",methods=["POST"])
+@rate_limit("request_reset", ip="5/minute", email="3/hour")
 def request_reset_password():
     data=request.get_json() or {}
     email=(data.get("email")or"")
@@ -148,21 +147,22 @@ def request_reset_password():
             "reset_password_token": token_hash,
             "reset_password_expires": expires_at
         }})
+        invalidate_user(user["_id"])
 
         frontend_base = os.getenv("FRONTEND_URL", "http://localhost:3000").rstrip("/")
         reset_path = f"/reset-password?token={raw_token}&email={email}"
         reset_url = frontend_base + reset_path
 
         try:
-            send_reset_email_sendgrid(email, reset_url)
+            send_reset_email(email, reset_url)
         except Exception:
-            # Log already handled inside helper
-            pass
+            current_app.logger.exception("failed to queue reset email")
 
     return jsonify({"msg": "If an account exists, you will receive a reset email"}), 200
 
 
 @auth_bp.route("/reset-password", methods=["POST"])
+@rate_limit("reset_password", ip="10/minute", email="5/minute")
 def reset_password():
     data = request.get_json() or {}
     email = (data.get("email") or "").strip().lower()
@@ -191,10 +191,11 @@ def reset_password():
     if not _compare_hashesh(_hash_token(token), stored_hash):
         return jsonify({"msg": "Invalid token or expired"}), 400
     
-    new_pw_hash = generate_password_hash(new_password)
+    new_pw_hash = hash_password(new_password)
     users.update_one({"_id": user["_id"]}, {"$set": {"password": new_pw_hash}, "$unset": {
         "reset_password_token": "", "reset_password_expires": ""
     }})
+    invalidate_user(user["_id"])
 
     return jsonify({"msg": "Password updated"}), 200
 
@@ -1,28 +1,75 @@
-from flask import Blueprint, request, jsonify,current_app
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 # from extensions import mongo
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from bson.objectid import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
 import datetime
-import cloudinary
-import cloudinary.uploader
 import os
 from extensions import mongo
+from utils.images import destroy_image, enqueue_upload, pending_image
+from utils.likes import PostNotFound, delete_post_likes, is_liked, liked_post_ids
+from utils.likes import toggle_like as toggle_post_like
+from utils.http_cache import FEED, cached_get, invalidate_feed, invalidate_post, post_namespace, version_etag
+from utils.author_stats import record_engagement, record_post_deleted, record_posts
+from utils.authors import attach_authors, author_ref, fetch_usernames
+from utils.db import read_db
+from utils.ratelimit import InflightLimit, rate_limit
+from utils.search import ensure_search_index, index_post, unindex_post
+from utils import tasks
+from utils.timelines import entry as timeline_entry, fan_out, retract
+from utils.trending import add_trending, ensure_trending, remove_trending, update_trending_counts
+from utils.suggest import add_suggestions, ensure_suggest_index, remove_suggestions, update_suggestion_counts
+from utils.text import derived_fields, fill_missing_excerpts
+from utils.pagination import (
+    DEFAULT_PER_PAGE, MAX_PER_PAGE, MAX_SKIP, decode_cursor, keyset_filter, next_cursor, parse_int
+)
 
 posts_bp = Blueprint("posts", __name__)
 
-cloudinary.config(
-    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
-    api_key=os.getenv("CLOUDINARY_API_KEY"),
-    api_secret_key=os.getenv("CLOUDINARY_API_SECRET"),
-    secure=True
-)
-
 ALLOWED_EXT = {"png", "jpg", "jpeg", "webp"}
+COMMENTS_SORT = [("created_at", -1), ("_id", -1)]
+DEFAULT_COMMENTS_PER_PAGE = 20
+MAX_COMMENTS_PER_PAGE = 100
+COMMENTS_STREAM_BATCH = 200
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
+MAX_BATCH_IDS = 50
+MAX_BULK_POSTS = 500
+MAX_CLOCK_SKEW = datetime.timedelta(minutes=5)  # allowance for bulk created_at
+
+# Feed cards only need these. Posts written before excerpts were stored get
+# one from fill_missing_excerpts (utils/text.py) until backfill-excerpts runs.
+SUMMARY_PROJECTION = {
+    "title": 1,
+    "excerpt": 1,
+    "reading_time": 1,
+    "image": 1,
+    "tags": 1,
+    "likes_count": 1,
+    "comments_count": 1,
+    "author_id": 1,
+    "created_at": 1,
+    "updated_at": 1,
+}
 
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".",1)[1].lower() in ALLOWED_EXT 
 
+def read_image_upload(file):
+    """Validate an uploaded image and return (bytes, None) or (None, error response)."""
+    filename = file.filename or ""
+    if not allowed_file(filename):
+        return None, (jsonify({"msg": "invalid image type"}), 400)
+
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    file.seek(0)
+    if size > current_app.config.get("MAX_FILE_SIZE", MAX_FILE_SIZE):
+        return None, (jsonify({"msg": "file too large"}), 400)
+
+    # read now: the request stream is gone by the time the worker runs
+    return file.read(), None
+
 ##CREATE POST
 @posts_bp.route("/", methods=["POST"])
 @jwt_required()
@@ -30,6 +77,7 @@ def create_post():
     # mongo = current_app.extensions["mongo"]
     user_id = get_jwt_identity()
 
+    image_data = None
     if request.content_type and request.content_type.startswith("application/json"):
         data = request.get_json() or {}
         title = (data.get("title") or "").strip()
@@ -48,44 +96,13 @@ def create_post():
         file = request.files.get("image")
         image_meta = None
 
-        
+        # The upload itself happens in the background; the post is saved
+        # right away with image.status "pending".
         if file:
-            filename = file.filename or ""
-            if not allowed_file(filename):
-                return jsonify({"msg": "invalid image type"}), 400
-            
-            file.seek(0, os.SEEK_END)
-            size = file.tell()
-            file.seek(0)
-            if size > current_app.config.get("MAX_FILE_SIZE", MAX_FILE_SIZE):
-                return jsonify({"msg": "file too large"}), 400
-            
-
-            try:
-                upload_result = cloudinary.uploader.upload(
-                file,
-                folder="blog_platform/posts",
-                use_filename=True,
-                unique_filename=True,
-                resource_type="image",
-                transformation=[{"width": 1600, "crop": "limit"}]
-                )
-                print("Cloudinary upload result:", upload_result)
-            except Exception as e:
-    # debug: print full exception
-                import traceback
-                traceback.print_exc()
-                return jsonify({"msg": f"upload error: {str(e)}"}), 500
-
-            
-            image_meta = {
-                "url": upload_result.get("secure_url") or upload_result.get("url"),
-                "public_id": upload_result.get("public_id"),
-                "width": upload_result.get("width"),
-                "height": upload_result.get("height"),
-                "size": upload_result.get("bytes"),
-                "format": upload_result.get("format"),
-            }
+            image_data, error = read_image_upload(file)
+            if error:
+                return error
+            image_meta = pending_image(file.filename)
 
     if not title or not body:
         return jsonify({"msg": "title and body are required"}), 400
@@ -99,28 +116,172 @@ def create_post():
         "image": image_meta,
         "created_at": datetime.datetime.utcnow(),
         "updated_at": None,
-        "likes": []
+        "likes_count": 0,
+        "comments_count": 0,
+        **derived_fields(body)
     }
     res = mongo.db.posts.insert_one(post)
     post_id = str(res.inserted_id)
     post["id"] = post_id
+    post["is_liked"] = False
+    index_post(post)
+    add_suggestions(post)
+    add_trending(post)
+    record_posts(user_id, 1, post["created_at"])
+    # push to followers' home timelines off the request path
+    tasks.submit(fan_out, user_id, [timeline_entry(post)], retries=2)
     post.pop("_id", None)
+    if image_data is not None:
+        enqueue_upload(post_id, image_meta, image_data)
+    invalidate_feed()
     return jsonify(post), 201 
 
+def _bulk_item(item, user_id, now):
+    """Validate one bulk import item; returns (post, None) or (None, error message)."""
+    if not isinstance(item, dict):
+        return None, "item must be an object"
+    title = (item.get("title") or "").strip() if isinstance(item.get("title"), str) else ""
+    body = (item.get("body") or "").strip() if isinstance(item.get("body"), str) else ""
+    if not title or not body:
+        return None, "title and body are required"
+    tags = item.get("tags") or []
+    if not isinstance(tags, list) or not all(isinstance(t, str) for t in tags):
+        return None, "tags must be a list of strings"
+
+    created_at = now
+    if item.get("created_at"):
+        # migrations keep the original publish time
+        try:
+            created_at = datetime.datetime.fromisoformat(str(item["created_at"]).replace("Z", "+00:00"))
+        except ValueError:
+            return None, "created_at must be an ISO 8601 timestamp"
+        if created_at.tzinfo is not None:
+            created_at = created_at.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        # a future date would pin the post to the top of the feed and trending
+        if created_at > now + MAX_CLOCK_SKEW:
+            return None, "created_at cannot be in the future"
+
+    return {
+        "_id": ObjectId(),
+        "title": title,
+        "body": body,
+        "author_id": user_id,
+        "tags": [t.strip() for t in tags if t.strip()],
+        "image": None,
+        "created_at": created_at,
+        # a historical created_at is behind the search / suggest sync watermarks; this isn't
+        "updated_at": now,
+        "likes_count": 0,
+        "comments_count": 0,
+        **derived_fields(body)
+    }, None
+
+##BULK IMPORT
+@posts_bp.route("/bulk", methods=["POST"])
+@jwt_required()
+def bulk_import_posts():
+    """
+    Body: { posts: [ { title, body, tags?, created_at? }, ... ] } (max 500)
+    Every post is authored by the caller. Valid items are written with one
+    unordered insert_many, so one bad item doesn't stop the rest.
+    Returns:
+      { inserted: [ { index, id } ], errors: [ { index, msg } ] }
+    """
+    user_id = get_jwt_identity()
+    items = (request.get_json(silent=True) or {}).get("posts")
+    if not isinstance(items, list) or not items:
+        return jsonify({"msg": "posts must be a non-empty list"}), 400
+    if len(items) > MAX_BULK_POSTS:
+        return jsonify({"msg": f"at most {MAX_BULK_POSTS} posts per request"}), 400
+
+    now = datetime.datetime.utcnow()
+    docs, positions, errors = [], [], []
+    for index, item in enumerate(items):
+        post, error = _bulk_item(item, user_id, now)
+        if error:
+            errors.append({"index": index, "msg": error})
+        else:
+            docs.append(post)
+            positions.append(index)
+
+    failed = set()
+    if docs:
+        try:
+            mongo.db.posts.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            for err in e.details.get("writeErrors", []):
+                failed.add(err["index"])
+                errors.append({"index": positions[err["index"]], "msg": err.get("errmsg", "write failed")})
+
+    inserted = []
+    for i, post in enumerate(docs):
+        if i in failed:
+            continue
+        index_post(post)
+        add_suggestions(post)
+        add_trending(post)
+        inserted.append({"index": positions[i], "id": str(post["_id"])})
+    if inserted:
+        invalidate_feed()
+        ok = [docs[i] for i in range(len(docs)) if i not in failed]
+        record_posts(user_id, len(ok), max(p["created_at"] for p in ok))
+        tasks.submit(fan_out, user_id, [timeline_entry(p) for p in ok], retries=2)
+
+    errors.sort(key=lambda e: e["index"])
+    return jsonify({"inserted": inserted, "errors": errors}), 201 if inserted else 400
+
 ##GET LIST OF POSTS
 @posts_bp.route("/", methods=["GET"])
+@cached_get(lambda: FEED)
 def list_posts():
-    page = int(request.args.get("page", 1))
-    per_page = int(request.args.get("per_page", 10))
+    """
+    Query params:
+      cursor: opaque token from a previous response's next_cursor (preferred)
+      page: legacy page number, only used when no cursor is given; deprecated,
+            and limited to the first MAX_SKIP posts
+      per_page: optional (default 10, max 50)
+      author_id: optional, restrict to one author
+      fields: summary (default, no body) or full
+    Returns:
+      { posts: [...], page, next_cursor }
+    """
+    per_page = parse_int(request.args.get("per_page"), DEFAULT_PER_PAGE, maximum=MAX_PER_PAGE)
+    page = parse_int(request.args.get("page"), 1)
     author_id = request.args.get("author_id")
-    
+    token = request.args.get("cursor")
+    fields = request.args.get("fields", "summary")
+    if fields not in ("summary", "full"):
+        return jsonify({"msg": "fields must be summary or full"}), 400
+    projection = SUMMARY_PROJECTION if fields == "summary" else {"likes": 0}
+
     query = {}
     if author_id:
         query["author_id"] = author_id
 
-    skip = (page - 1) * per_page
-    cursor = mongo.db.posts.find(query).sort("created_at", -1).skip(skip).limit(per_page)
-    
+    # Keyset pagination: seek straight to (created_at, _id) on the feed index
+    # instead of skipping over every earlier document.
+    if token:
+        try:
+            created_at, last_id = decode_cursor(token)
+        except ValueError:
+            return jsonify({"msg": "invalid cursor"}), 400
+        query.update(keyset_filter(created_at, last_id))
+        skip = 0
+    else:
+        skip = (page - 1) * per_page
+        if skip > MAX_SKIP:
+            return jsonify({"msg": f"page too deep, follow next_cursor past the first {MAX_SKIP} posts"}), 400
+
+    cursor = (
+        read_db().posts.find(query, projection)
+        .sort([("created_at", -1), ("_id", -1)])
+        .skip(skip)
+        .limit(per_page + 1)
+    )
+    docs, cursor_out = next_cursor(list(cursor), per_page)
+    if fields == "summary":
+        fill_missing_excerpts(docs, read_db())
+
     # Check for optional auth to determine "is_liked" status
     from flask_jwt_extended import verify_jwt_in_request
     try:
@@ -129,60 +290,125 @@ def list_posts():
     except:
         current_user_id = None
 
+    liked = liked_post_ids(current_user_id, [p["_id"] for p in docs])
+
     posts = []
-    for p in cursor:
+    for p in docs:
         p["id"] = str(p["_id"])
         p.pop("_id", None)
-        likes = p.get("likes", [])
-        p["likes_count"] = len(likes)
-        p["is_liked"] = current_user_id in likes if current_user_id else False
-        
-        # Populate author
-        author_id = p.get("author_id")
-        if author_id:
-            try:
-                author = mongo.db.users.find_one({"_id": ObjectId(author_id)})
-                p["author"] = {"id": str(author_id), "username": author.get("username")} if author else {"id": str(author_id), "username": "Unknown"}
-            except Exception:
-                p["author"] = {"id": str(author_id), "username": "Unknown"}
-        else:
-            p["author"] = {"id": None, "username": "Unknown"}
-
+        p["likes_count"] = p.get("likes_count", 0)
+        p["comments_count"] = p.get("comments_count", 0)
+        p["is_liked"] = p["id"] in liked
         posts.append(p)
-    return jsonify({"posts": posts, "page": page})
+
+    # Populate authors for the whole page in one query
+    attach_authors(posts)
+    resp = jsonify({"posts": posts, "page": page, "next_cursor": cursor_out})
+    resp.set_etag(version_etag(
+        fields, cursor_out, current_user_id,
+        [(p["id"], p.get("updated_at") or p.get("created_at"), p["likes_count"], p["comments_count"], p["is_liked"])
+         for p in posts],
+    ))
+    return resp
 
 ##GET POST BY UID
 @posts_bp.route("/<post_id>", methods=["GET"])
+@cached_get(post_namespace)
 def get_post(post_id):
     try:
-        p = mongo.db.posts.find_one({"_id": ObjectId(post_id)})
+        p = read_db().posts.find_one({"_id": ObjectId(post_id)}, {"likes": 0})
     except:
         return jsonify({"msg": "invalid id"}), 400
+    if not p and read_db() is not mongo.db:
+        # just created and not replicated yet; ask the primary before answering 404
+        p = mongo.db.posts.find_one({"_id": ObjectId(post_id)}, {"likes": 0})
     if not p:
         return jsonify({"msg": "not found"}), 404
+    from flask_jwt_extended import verify_jwt_in_request
+    try:
+        verify_jwt_in_request(optional=True)
+        current_user_id = get_jwt_identity()
+    except:
+        current_user_id = None
+
+    p["likes_count"] = p.get("likes_count", 0)
+    p["comments_count"] = p.get("comments_count", 0)
+    p["is_liked"] = is_liked(current_user_id, p["_id"])
     p["id"] = str(p["_id"])
     p.pop("_id", None)
-    
+
+    # Populate author
+    attach_authors([p])
+    resp = jsonify(p)
+    resp.set_etag(version_etag(
+        p["id"], p.get("updated_at") or p.get("created_at"), p["likes_count"], p["comments_count"],
+        current_user_id, p["is_liked"]
+    ))
+    return resp
+
+##GET MANY POSTS BY ID
+@posts_bp.route("/batch", methods=["GET"])
+@cached_get(lambda: FEED)
+def get_posts_batch():
+    """
+    Query params:
+      ids: comma separated post ids (max 50)
+      fields: summary (default, no body) or full
+    Returns:
+      { posts: [...] in the order asked for, missing: [ids not found or invalid] }
+    """
+    raw_ids = [i.strip() for i in (request.args.get("ids") or "").split(",") if i.strip()]
+    # canonical (lower-case) hex, so a differently cased id still matches str(_id) below
+    ids = list(dict.fromkeys(str(ObjectId(i)) if ObjectId.is_valid(i) else i for i in raw_ids))
+    if not ids:
+        return jsonify({"posts": [], "missing": []}), 200
+    if len(ids) > MAX_BATCH_IDS:
+        return jsonify({"msg": f"at most {MAX_BATCH_IDS} ids per request"}), 400
+    fields = request.args.get("fields", "summary")
+    if fields not in ("summary", "full"):
+        return jsonify({"msg": "fields must be summary or full"}), 400
+    projection = SUMMARY_PROJECTION if fields == "summary" else {"likes": 0}
+
+    oids = []
+    for i in ids:
+        try:
+            oids.append(ObjectId(i))
+        except Exception:
+            pass
+    found = {str(p["_id"]): p for p in read_db().posts.find({"_id": {"$in": oids}}, projection)} if oids else {}
+    if fields == "summary":
+        fill_missing_excerpts(list(found.values()), read_db())
+
     from flask_jwt_extended import verify_jwt_in_request
     try:
         verify_jwt_in_request(optional=True)
         current_user_id = get_jwt_identity()
     except:
         current_user_id = None
-        
-    likes = p.get("likes", [])
-    p["likes_count"] = len(likes)
-    p["is_liked"] = current_user_id in likes if current_user_id else False
 
-    # Populate author
-    author_id = p.get("author_id")
-    if author_id:
-        author = mongo.db.users.find_one({"_id": ObjectId(author_id)})
-        p["author"] = {"id": str(author_id), "username": author.get("username")} if author else {"id": str(author_id), "username": "Unknown"}
-    else:
-        p["author"] = {"id": None, "username": "Unknown"}
-    
-    return jsonify(p)
+    liked = liked_post_ids(current_user_id, [p["_id"] for p in found.values()])
+
+    posts, missing = [], []
+    for i in ids:
+        p = found.get(i)
+        if p is None:
+            missing.append(i)
+            continue
+        p["id"] = i
+        p.pop("_id", None)
+        p["likes_count"] = p.get("likes_count", 0)
+        p["comments_count"] = p.get("comments_count", 0)
+        p["is_liked"] = i in liked
+        posts.append(p)
+
+    attach_authors(posts)
+    resp = jsonify({"posts": posts, "missing": missing})
+    resp.set_etag(version_etag(
+        fields, current_user_id, missing,
+        [(p["id"], p.get("updated_at") or p.get("created_at"), p["likes_count"], p["comments_count"], p["is_liked"])
+         for p in posts],
+    ))
+    return resp
 
 
 @posts_bp.route("/<post_id>", methods=["PUT"])
@@ -203,7 +429,7 @@ def update_post(post_id):
     is_json = request.content_type and request.content_type.startswith("application/json")
     
     updates = {}
-    new_image_meta = None
+    new_image_data = None
     remove_old_image = False
 
     if is_json:
@@ -234,44 +460,13 @@ def update_post(post_id):
             updates["tags"] = [t.strip() for t in tags.split(",") if t.strip()]
 
         file = request.files.get("image")
-        # If file is provided, upload to Cloudinary and prepare image metadata
+        # If file is provided, store a pending image and upload it in the background;
+        # the worker removes the old image once the new one is in place.
         if file:
-            filename = file.filename or ""
-            if not allowed_file(filename):
-                return jsonify({"msg": "invalid image type"}), 400
-
-            file.seek(0, os.SEEK_END)
-            size = file.tell()
-            file.seek(0)
-            if size > current_app.config.get("MAX_FILE_SIZE", MAX_FILE_SIZE):
-                return jsonify({"msg": "file too large"}), 400
-
-            try:
-                # upload to Cloudinary
-                upload_result = cloudinary.uploader.upload(
-                    file,
-                    folder="blog_platform/posts",
-                    use_filename=True,
-                    unique_filename=True,
-                    resource_type="image",
-                    transformation=[{"width": 1600, "crop": "limit"}]
-                )
-            except Exception as e:
-                current_app.logger.exception("Cloudinary upload failed")
-                return jsonify({"msg": f"upload error: {str(e)}"}), 500
-            
-            new_image_meta = {
-                "url": upload_result.get("secure_url") or upload_result.get("url"),
-                "public_id": upload_result.get("public_id"),
-                "width": upload_result.get("width"),
-                "height": upload_result.get("height"),
-                "size": upload_result.get("bytes"),
-                "format": upload_result.get("format"),
-            }
-            updates["image"] = new_image_meta
-            # mark to remove old image if present
-            if post.get("image") and post["image"].get("public_id"):
-                remove_old_image = True
+            new_image_data, error = read_image_upload(file)
+            if error:
+                return error
+            updates["image"] = pending_image(file.filename)
 
     # Basic validation: we don't allow empty title/body after update if not intentionally removing
     if "title" in updates and not updates["title"]:
@@ -279,23 +474,27 @@ def update_post(post_id):
     if "body" in updates and not updates["body"]:
         return jsonify({"msg": "body cannot be empty"}), 400
 
+    if "body" in updates:
+        updates.update(derived_fields(updates["body"]))
+
     if updates:
         updates["updated_at"] = datetime.datetime.utcnow()
         mongo.db.posts.update_one({"_id": ObjectId(post_id)}, {"$set": updates})
+        invalidate_post(post_id)
 
-    # If requested to remove old image, delete it from Cloudinary
-    if remove_old_image:
-        old_img = post.get("image") or {}
-        public_id = old_img.get("public_id")
-        if public_id:
-            try:
-                cloudinary.uploader.destroy(public_id, invalidate=True, resource_type="image")
-            except Exception as e:
-                # log but do not fail the request: post already updated in DB
-                current_app.logger.exception(f"failed to delete old image {public_id}: {e}")
+    old_public_id = (post.get("image") or {}).get("public_id")
+    if new_image_data is not None:
+        enqueue_upload(post_id, updates["image"], new_image_data, old_public_id)
+    elif remove_old_image:
+        # If requested to remove old image, delete it in the background
+        destroy_image(old_public_id)
 
     # Return updated post
-    updated = mongo.db.posts.find_one({"_id": ObjectId(post_id)})
+    updated = mongo.db.posts.find_one({"_id": ObjectId(post_id)}, {"likes": 0})
+    if updates:
+        index_post(updated)
+        add_suggestions(updated)
+        add_trending(updated)
     updated["id"] = str(updated["_id"])
     updated.pop("_id", None)
     return jsonify(updated), 200
@@ -318,20 +517,26 @@ def delete_post(post_id):
     image = post.get("image") or {}
     public_id = image.get("public_id")
 
-    if public_id:
-        try:
-            cloudinary.uploader.destroy(public_id, invalidate=True, resource_type="image")
-            print(f"{public_id} Image delete successfull")
-        except Exception as e:
-            current_app.logger.exception(f"failed to delete image {public_id}: {e}")
-            # we don't block deletion because of image deletion failure
+    if not mongo.db.posts.delete_one({"_id": ObjectId(post_id)}).deleted_count:
+        return jsonify({"msg": "no post found"}), 404
+    record_post_deleted(post)
 
-    mongo.db.posts.delete_one({"_id": ObjectId(post_id)})
+    # we don't block deletion on the image; a pending upload cleans up after itself
+    if public_id:
+        destroy_image(public_id)
+    delete_post_likes(ObjectId(post_id))
+    unindex_post(post_id)
+    remove_suggestions(post_id)
+    remove_trending(post_id)
+    invalidate_post(post_id)
+    tasks.submit(retract, str(post.get("author_id")), post["_id"], retries=2)
 
     return jsonify({"msg": "deleted"}), 200
 
 ##SEARCH
 @posts_bp.route("/search_top", methods=["GET"])
+@rate_limit("search", ip="60/minute", user="120/minute")
+@InflightLimit("search", default=8)
 def search_top():
     """
     Query params:
@@ -351,61 +556,85 @@ def search_top():
         limit = 5
     limit = max(1, min(limit, 20))
 
-    # Primary approach: use $text (requires text index on title, body, tags)
-    # Score is available via {"score": {"$meta": "textScore"}}
-    try:
-        proj = {
-            "title": 1,
-            "body": 1,
-            "author_id": 1,
-            "image": 1,
-            "created_at": 1,
-            "score": {"$meta": "textScore"}
-        }
-        cursor = mongo.db.posts.find({"$text": {"$search": q}}, proj)
-        cursor = cursor.sort([("score", {"$meta": "textScore"}), ("created_at", -1)]).limit(limit)
-
-        results = []
-        for p in cursor:
-            # create short snippet from body (first 180 chars)
-            body = p.get("body", "") or ""
-            snippet = body[:180].rsplit(" ", 1)[0]  # avoid cutting mid-word
-            results.append({
-                "id": str(p["_id"]),
-                "title": p.get("title"),
-                "body_snippet": snippet,
-                "author_id": p.get("author_id"),
-                "image": p.get("image"),
-                "score": p.get("score"),
-                "created_at": p.get("created_at")
-            })
-
-        return jsonify({"results": results}), 200
-
-    except Exception as e:
-        # Fallback: if text index isn't present or $text fails, use case-insensitive regex on title/body
-        current_app.logger.info("Text search failed, falling back to regex search: %s", e)
-        try:
-            regex = {"$regex": q, "$options": "i"}
-            filt = {"$or": [{"title": regex}, {"body": regex}, {"tags": regex}]}
-            cursor = mongo.db.posts.find(filt, {"title":1,"body":1,"author_id":1,"image":1,"created_at":1}).sort("created_at", -1).limit(limit)
-            results = []
-            for p in cursor:
-                body = p.get("body", "") or ""
-                snippet = body[:180].rsplit(" ", 1)[0]
-                results.append({
-                    "id": str(p["_id"]),
-                    "title": p.get("title"),
-                    "body_snippet": snippet,
-                    "author_id": p.get("author_id"),
-                    "image": p.get("image"),
-                    "score": None,
-                    "created_at": p.get("created_at")
-                })
-            return jsonify({"results": results}), 200
-        except Exception as e2:
-            current_app.logger.exception("Search fallback failed: %s", e2)
-            return jsonify({"results": []}), 500
+    # Rank in memory (BM25 over title/tags/body), then fetch just the hits
+    index = ensure_search_index(current_app, mongo.db)
+    hits = index.search(q, limit)
+    if not hits:
+        return jsonify({"results": []}), 200
+
+    proj = {
+        "title": 1, "excerpt": 1, "author_id": 1, "image": 1,
+        "likes_count": 1, "comments_count": 1, "created_at": 1
+    }
+    docs = {str(p["_id"]): p for p in read_db().posts.find({"_id": {"$in": [ObjectId(h) for h, _ in hits]}}, proj)}
+    missing = [ObjectId(h) for h, _ in hits if h not in docs]
+    if missing and read_db() is not mongo.db:
+        # a lagging secondary may not have a just-created post yet; only the primary can say it is gone
+        for p in mongo.db.posts.find({"_id": {"$in": missing}}, proj):
+            docs[str(p["_id"])] = p
+    fill_missing_excerpts(list(docs.values()), mongo.db)
+
+    results = []
+    for doc_id, score in hits:
+        p = docs.get(doc_id)
+        if p is None:
+            # deleted by another worker since it was indexed
+            unindex_post(doc_id)
+            continue
+        # snippet is the excerpt stored at write time
+        results.append({
+            "id": doc_id,
+            "title": p.get("title"),
+            "body_snippet": p.get("excerpt") or "",
+            "author_id": p.get("author_id"),
+            "image": p.get("image"),
+            "likes_count": p.get("likes_count", 0),
+            "comments_count": p.get("comments_count", 0),
+            "score": round(score, 4),
+            "created_at": p.get("created_at")
+        })
+
+    attach_authors(results)
+    return jsonify({"results": results}), 200
+
+##SUGGEST
+@posts_bp.route("/suggest", methods=["GET"])
+def suggest():
+    """
+    Query params:
+      prefix: what the user has typed so far (required)
+      limit: optional (default 8, max 20)
+    Returns:
+      { suggestions: [ { text, type: "title" | "tag", post_id, score }, ... ] }
+    """
+    prefix = (request.args.get("prefix") or "").strip()
+    if not prefix:
+        return jsonify({"suggestions": []}), 200
+    limit = parse_int(request.args.get("limit"), 8, maximum=20)
+
+    index = ensure_suggest_index(current_app, mongo.db)
+    resp = jsonify({"suggestions": index.suggest(prefix, limit)})
+    resp.headers["Cache-Control"] = "public, max-age=30"
+    return resp, 200
+
+
+##TRENDING
+@posts_bp.route("/trending", methods=["GET"])
+def trending():
+    """
+    Query params:
+      limit: optional (default 10, max 50)
+      tag: optional, only posts with this tag
+    Returns:
+      { posts: [ { id, title, excerpt, author, likes_count, comments_count, score, ... } ] }
+    Served from the in-memory ranking (utils/trending.py); is_liked is not included.
+    """
+    limit = parse_int(request.args.get("limit"), 10, maximum=MAX_PER_PAGE)
+    tag = (request.args.get("tag") or "").strip() or None
+    index = ensure_trending(current_app, mongo.db)
+    resp = jsonify({"posts": index.top(limit, tag)})
+    resp.headers["Cache-Control"] = "public, max-age=30"
+    return resp, 200
 
 
 ## COMMENTS
@@ -421,78 +650,147 @@ def add_comment(post_id):
         return jsonify({"msg": "comment body required"}), 400
 
     try:
-        post = mongo.db.posts.find_one({"_id": ObjectId(post_id)})
+        oid = ObjectId(post_id)
     except:
         return jsonify({"msg": "invalid post id"}), 400
-    
+
+    # Bumping the counter doubles as the existence check for the post
+    post = mongo.db.posts.find_one_and_update(
+        {"_id": oid}, {"$inc": {"comments_count": 1}},
+        projection={"comments_count": 1, "author_id": 1}, return_document=ReturnDocument.AFTER
+    )
     if not post:
         return jsonify({"msg": "post not found"}), 404
 
     comment = {
-        "post_id": ObjectId(post_id),
+        "post_id": oid,
         "author_id": user_id,
         "body": body,
         "created_at": datetime.datetime.utcnow()
     }
 
-    res = mongo.db.comments.insert_one(comment)
+    try:
+        res = mongo.db.comments.insert_one(comment)
+    except Exception:
+        mongo.db.posts.update_one({"_id": oid}, {"$inc": {"comments_count": -1}})
+        raise
+    record_engagement(post.get("author_id"), comments=1)
+    invalidate_post(post_id)
+    update_suggestion_counts(post_id, comments_count=post["comments_count"])
+    update_trending_counts(post_id, comments_count=post["comments_count"])
     
     # Fetch user details to return with comment
-    user = mongo.db.users.find_one({"_id": ObjectId(user_id)})
-    
+    author = author_ref(user_id, fetch_usernames([user_id]))
+
     return jsonify({
         "id": str(res.inserted_id),
         "body": body,
-        "author": {
-            "id": user_id,
-            "username": user.get("username") if user else "Unknown"
-        },
+        "author": author,
         "created_at": comment["created_at"]
     }), 201
 
+def _comment_out(c):
+    return {
+        "id": str(c["_id"]),
+        "body": c.get("body"),
+        "author_id": c.get("author_id"),
+        "created_at": c.get("created_at")
+    }
+
+def _with_authors(comments):
+    # Resolve every comment author in one query
+    attach_authors(comments)
+    for c in comments:
+        c.pop("author_id", None)
+    return comments
+
+def _stream_comments(query, batch_size):
+    """Yield a JSON array of comments, resolving authors one batch at a time."""
+    dumps = current_app.json.dumps
+    cursor = read_db().comments.find(query).sort(COMMENTS_SORT).batch_size(batch_size)
+    yield "["
+    first = True
+    batch = []
+    for c in cursor:
+        batch.append(_comment_out(c))
+        if len(batch) < batch_size:
+            continue
+        for out in _with_authors(batch):
+            yield ("" if first else ",") + dumps(out)
+            first = False
+        batch = []
+    for out in _with_authors(batch):
+        yield ("" if first else ",") + dumps(out)
+        first = False
+    yield "]"
+
 @posts_bp.route("/<post_id>/comments", methods=["GET"])
 def get_comments(post_id):
+    """
+    Query params:
+      cursor: opaque token from a previous response's next_cursor
+      limit: optional (default 20, max 100)
+      stream: 1 to stream every comment (from cursor on) as one JSON array
+    Returns:
+      { comments: [ { id, body, author, created_at }, ... ], next_cursor }
+    """
     try:
-        # verify post exists first (optional but good for 404)
-        if not mongo.db.posts.find_one({"_id": ObjectId(post_id)}):
-             return jsonify({"msg": "post not found"}), 404
-             
-        cursor = mongo.db.comments.find({"post_id": ObjectId(post_id)}).sort("created_at", -1)
-        comments = []
-        
-        for c in cursor:
-            author_id = c.get("author_id")
-            user = mongo.db.users.find_one({"_id": ObjectId(author_id)})
-            comments.append({
-                "id": str(c["_id"]),
-                "body": c.get("body"),
-                "author": {
-                    "id": str(author_id),
-                    "username": user.get("username") if user else "Unknown"
-                },
-                "created_at": c.get("created_at")
-            })
-            
-        return jsonify(comments), 200
-    except Exception as e:
+        oid = ObjectId(post_id)
+    except Exception:
         return jsonify({"msg": "invalid id"}), 400
 
+    query = {"post_id": oid}
+    token = request.args.get("cursor")
+    if token:
+        try:
+            created_at, last_id = decode_cursor(token)
+        except ValueError:
+            return jsonify({"msg": "invalid cursor"}), 400
+        query.update(keyset_filter(created_at, last_id))
+
+    if request.args.get("stream") == "1":
+        return Response(
+            stream_with_context(_stream_comments(query, COMMENTS_STREAM_BATCH)),
+            mimetype="application/json"
+        )
+
+    limit = parse_int(request.args.get("limit"), DEFAULT_COMMENTS_PER_PAGE, maximum=MAX_COMMENTS_PER_PAGE)
+    docs = list(read_db().comments.find(query).sort(COMMENTS_SORT).limit(limit + 1))
+    docs, cursor_out = next_cursor(docs, limit)
+
+    # Only an empty first page needs the post lookup, to tell "no comments" from 404;
+    # asked of the primary so a post created a moment ago is never reported missing
+    if not docs and not token and not mongo.db.posts.find_one({"_id": oid}, {"_id": 1}):
+        return jsonify({"msg": "post not found"}), 404
+
+    comments = _with_authors([_comment_out(c) for c in docs])
+    return jsonify({"comments": comments, "next_cursor": cursor_out}), 200
+
 @posts_bp.route("/<post_id>/comments/<comment_id>", methods=["DELETE"])
 @jwt_required()
 def delete_comment(post_id, comment_id):
     user_id = get_jwt_identity()
     try:
-        comment = mongo.db.comments.find_one({"_id": ObjectId(comment_id), "post_id": ObjectId(post_id)})
+        filt = {"_id": ObjectId(comment_id), "post_id": ObjectId(post_id)}
     except:
          return jsonify({"msg": "invalid id"}), 400
-         
-    if not comment:
+
+    # Owner check is part of the delete; only a miss needs a second look
+    res = mongo.db.comments.delete_one({**filt, "author_id": user_id})
+    if not res.deleted_count:
+        if mongo.db.comments.find_one(filt, {"_id": 1}):
+            return jsonify({"msg": "forbidden"}), 403
         return jsonify({"msg": "comment not found"}), 404
-        
-    if str(comment.get("author_id")) != str(user_id):
-        return jsonify({"msg": "forbidden"}), 403
 
-    mongo.db.comments.delete_one({"_id": ObjectId(comment_id)})
+    post = mongo.db.posts.find_one_and_update(
+        {"_id": filt["post_id"]}, {"$inc": {"comments_count": -1}},
+        projection={"comments_count": 1, "author_id": 1}, return_document=ReturnDocument.AFTER
+    )
+    invalidate_post(post_id)
+    if post:
+        record_engagement(post.get("author_id"), comments=-1)
+        update_suggestion_counts(post_id, comments_count=post.get("comments_count", 0))
+        update_trending_counts(post_id, comments_count=post.get("comments_count", 0))
     return jsonify({"msg": "deleted"}), 200
 
 
@@ -503,26 +801,16 @@ def delete_comment(post_id, comment_id):
 def toggle_like(post_id):
     user_id = get_jwt_identity()
     try:
-        post = mongo.db.posts.find_one({"_id": ObjectId(post_id)})
+        oid = ObjectId(post_id)
     except:
         return jsonify({"msg": "invalid id"}), 400
-        
-    if not post:
+
+    try:
+        liked, new_count = toggle_post_like(oid, user_id)
+    except PostNotFound:
         return jsonify({"msg": "post not found"}), 404
-        
-    likes = post.get("likes") or []
-    
-    if user_id in likes:
-        # Unlike
-        mongo.db.posts.update_one({"_id": ObjectId(post_id)}, {"$pull": {"likes": user_id}})
-        liked = False
-    else:
-        # Like
-        mongo.db.posts.update_one({"_id": ObjectId(post_id)}, {"$addToSet": {"likes": user_id}})
-        liked = True
-        
-    # Return new count
-    updated_post = mongo.db.posts.find_one({"_id": ObjectId(post_id)})
-    new_count = len(updated_post.get("likes", []))
-    
+    invalidate_post(post_id)
+    update_suggestion_counts(post_id, likes_count=new_count)
+    update_trending_counts(post_id, likes_count=new_count)
+
     return jsonify({"liked": liked, "likes_count": new_count}), 200
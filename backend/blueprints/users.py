@@ -1,3 +1,108 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
 from extensions import mongo
+from utils.author_stats import STATS_FIELDS, AuthorNotFound, get_author_stats
+from utils.authors import attach_authors
+from utils.http_cache import FEED, cached_get, version_etag
+from utils.likes import liked_post_ids
+from utils.pagination import DEFAULT_PER_PAGE, MAX_PER_PAGE, decode_cursor, encode_cursor, parse_int
+from utils.text import fill_missing_excerpts
+from utils.timelines import UserNotFound, follow, timeline_entries, unfollow
 
+users_bp = Blueprint("users", __name__)
+
+
+@users_bp.errorhandler(UserNotFound)
+@users_bp.errorhandler(AuthorNotFound)
+def user_not_found(e):
+    return jsonify({"msg": "user not found"}), 404
+
+
+## FOLLOW
+
+@users_bp.route("/<user_id>/follow", methods=["POST"])
+@jwt_required()
+def follow_user(user_id):
+    me = get_jwt_identity()
+    if user_id == me:
+        return jsonify({"msg": "you cannot follow yourself"}), 400
+    created, followers_count = follow(me, user_id)
+    return jsonify({"following": True, "followers_count": followers_count}), 201 if created else 200
+
+
+@users_bp.route("/<user_id>/follow", methods=["DELETE"])
+@jwt_required()
+def unfollow_user(user_id):
+    me = get_jwt_identity()
+    removed, followers_count = unfollow(me, user_id)
+    return jsonify({"following": False, "followers_count": followers_count}), 200
+
+
+## AUTHOR STATS
+
+@users_bp.route("/<user_id>/stats", methods=["GET"])
+@cached_get(lambda user_id: FEED)
+def author_stats(user_id):
+    """
+    Totals for the author page, read from one author_stats document.
+    Returns:
+      { author_id, posts_count, likes_count, comments_count, last_post_at }
+    """
+    stats = get_author_stats(user_id)
+    out = {"author_id": user_id, **{field: stats.get(field) for field in STATS_FIELDS}}
+    resp = jsonify(out)
+    resp.set_etag(version_etag(*out.values()))
+    return resp
+
+
+## HOME FEED
+
+@users_bp.route("/feed", methods=["GET"])
+@jwt_required()
+def home_feed():
+    """
+    Posts by the people the caller follows (and the caller's own), newest first.
+    Query params:
+      cursor: opaque token from a previous response's next_cursor
+      per_page: optional (default 10, max 50)
+    Returns:
+      { posts: [...], next_cursor }
+    """
+    from blueprints.posts import SUMMARY_PROJECTION
+    me = get_jwt_identity()
+    per_page = parse_int(request.args.get("per_page"), DEFAULT_PER_PAGE, maximum=MAX_PER_PAGE)
+    after = None
+    token = request.args.get("cursor")
+    if token:
+        try:
+            after = decode_cursor(token)
+        except ValueError:
+            return jsonify({"msg": "invalid cursor"}), 400
+
+    entries = timeline_entries(me, after, per_page + 1)
+    cursor_out = None
+    if len(entries) > per_page:
+        entries = entries[:per_page]
+        cursor_out = encode_cursor(entries[-1]["created_at"], entries[-1]["post_id"])
+
+    ids = [e["post_id"] for e in entries]
+    found = {p["_id"]: p for p in mongo.db.posts.find({"_id": {"$in": ids}}, SUMMARY_PROJECTION)} if ids else {}
+    fill_missing_excerpts(list(found.values()), mongo.db)
+    liked = liked_post_ids(me, list(found))
+
+    posts = []
+    # timeline order; entries whose post was deleted since are skipped
+    for post_id in ids:
+        p = found.get(post_id)
+        if p is None:
+            continue
+        p["id"] = str(p.pop("_id"))
+        p["likes_count"] = p.get("likes_count", 0)
+        p["comments_count"] = p.get("comments_count", 0)
+        p["is_liked"] = p["id"] in liked
+        posts.append(p)
+
+    attach_authors(posts)
+    resp = jsonify({"posts": posts, "next_cursor": cursor_out})
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
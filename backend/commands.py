@@ -0,0 +1,95 @@
+# backend/commands.py
+# Maintenance commands, run with `flask --app app <command>`
+import click
+from extensions import mongo
+
+
+def register_commands(app):
+
+    @app.cli.command("ensure-indexes")
+    def ensure_indexes_command():
+        """Create every index declared in utils/indexes.py."""
+        from utils.indexes import ensure_indexes
+        failed = ensure_indexes(mongo.db, app.logger)
+        for collection, name, error in failed:
+            click.echo(f"FAILED {collection}.{name}: {error}", err=True)
+        if failed:
+            raise SystemExit(1)
+        click.echo("indexes ok")
+
+    @app.cli.command("audit-queries")
+    def audit_queries_command():
+        """explain() every endpoint query shape; exit 1 if any would COLLSCAN."""
+        from utils.indexes import audit_query_plans
+        problems = audit_query_plans(mongo.db)
+        for endpoint, stages, error in problems:
+            click.echo(f"{endpoint}: {error or ' <- '.join(stages)}", err=True)
+        if problems:
+            raise SystemExit(1)
+        click.echo("all query shapes use an index")
+
+    @app.cli.command("migrate-likes")
+    def migrate_likes():
+        """Move embedded posts.likes arrays into the likes collection."""
+        from utils.likes import migrate_embedded_likes
+        moved = migrate_embedded_likes(mongo.db)
+        click.echo(f"migrated likes for {moved} posts")
+
+    @app.cli.command("backfill-excerpts")
+    def backfill_excerpts():
+        """Store excerpt and reading_time on posts written before they existed."""
+        from pymongo import UpdateOne
+        from utils.text import derived_fields
+        ops, total = [], 0
+        for p in mongo.db.posts.find({"excerpt": {"$exists": False}}, {"body": 1}):
+            ops.append(UpdateOne({"_id": p["_id"]}, {"$set": derived_fields(p.get("body"))}))
+            if len(ops) >= 500:
+                total += mongo.db.posts.bulk_write(ops, ordered=False).modified_count
+                ops = []
+        if ops:
+            total += mongo.db.posts.bulk_write(ops, ordered=False).modified_count
+        click.echo(f"backfilled {total} posts")
+
+    @app.cli.command("build-search-index")
+    def build_search_index():
+        """Rebuild the in-process search index from posts and write the snapshot."""
+        from utils.search import rebuild, search_index
+        rebuild(app, mongo.db)
+        path = app.config.get("SEARCH_INDEX_PATH")
+        click.echo(f"indexed {len(search_index.doc_terms)} posts -> {path}")
+
+    @app.cli.command("reconcile-counters")
+    def reconcile_counters_command():
+        """Recompute posts.comments_count and posts.likes_count from their collections."""
+        from utils.counters import reconcile_counters
+        fixed = reconcile_counters(mongo.db)
+        for field, n in fixed.items():
+            click.echo(f"{field}: corrected {n} posts")
+
+    @app.cli.command("refresh-trending")
+    def refresh_trending_command():
+        """Rebuild the trending ranking from posts and write its snapshot."""
+        from utils.trending import refresh, trending_index
+        refresh(app, mongo.db)
+        click.echo(f"ranked {len(trending_index.entries)} posts -> {app.config.get('TRENDING_SNAPSHOT_PATH')}")
+
+    @app.cli.command("startup-report")
+    @click.option("--top", default=15, help="How many top-level modules to list.")
+    def startup_report_command(top):
+        """Time a cold `import app` by imported module and create_app() phase."""
+        from utils.startup import startup_report
+        modules, phases, total = startup_report(app.root_path)
+        click.echo(f"import app: {total * 1000:.1f}ms")
+        click.echo("imports (self time by top-level module):")
+        for module, seconds in sorted(modules.items(), key=lambda kv: -kv[1])[:top]:
+            click.echo(f"  {seconds * 1000:8.1f}ms  {module}")
+        click.echo("create_app phases:")
+        for name, seconds in phases:
+            click.echo(f"  {seconds * 1000:8.1f}ms  {name}")
+
+    @app.cli.command("rebuild-author-stats")
+    def rebuild_author_stats_command():
+        """Recompute every author_stats document from posts in one aggregation."""
+        from utils.author_stats import rebuild_author_stats
+        n = rebuild_author_stats(mongo.db)
+        click.echo(f"rebuilt stats for {n} authors")
@@ -3,12 +3,39 @@ from flask_pymongo import PyMongo
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 
+from utils.cache import TTLCache, make_backend
+from utils.metrics import command_collector, pool_collector
+
 # single instances to import across app
 mongo = PyMongo()
 jwt = JWTManager()
+user_cache = TTLCache("users")
+response_cache = TTLCache("responses", maxsize=2000, ttl=30)
+cache_backend = None
 
 def init_extensions(app):
     # config should be set on app before calling this
-    mongo.init_app(app)
+    global cache_backend
+    from utils.db import check_read_routing, client_options
+    check_read_routing(app.config)
+    # every Mongo command is attributed to the request that issued it (utils/metrics.py).
+    # connect=False (Flask-PyMongo's default, pinned here): no sockets or monitor
+    # threads until first use, so a preloading master never shares a live client
+    mongo.init_app(
+        app, connect=False, event_listeners=[command_collector, pool_collector], **client_options(app.config)
+    )
     jwt.init_app(app)
     CORS(app, resources={r"/api/*": {"origins": "*"}}, supports_credentials=True)
+
+    cache_backend = make_backend(app.config.get("CACHE_BACKEND_URL"))
+    user_cache.configure(
+        maxsize=app.config.get("USER_CACHE_SIZE", 10000),
+        ttl=app.config.get("USER_CACHE_TTL", 300),
+        backend=cache_backend,
+        local_ttl=app.config.get("USER_CACHE_LOCAL_TTL", 10) if cache_backend is not None else None,
+    )
+    response_cache.configure(
+        maxsize=app.config.get("RESPONSE_CACHE_SIZE", 2000),
+        ttl=app.config.get("RESPONSE_CACHE_TTL", 30),
+        backend=cache_backend,
+    )
@@ -0,0 +1,137 @@
+from bson.objectid import ObjectId
+from pymongo import DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from extensions import mongo
+
+# One author_stats document per author, _id = the author's id (a str, like
+# posts.author_id):
+#   posts_count, likes_count, comments_count   (totals over their posts)
+#   last_post_at
+# The post, like and comment write paths keep them in step with one upserted
+# $inc each, so no write is ever dropped. Until a document is `seeded` it
+# only holds those deltas: the first read adds the totals aggregated from the
+# author's posts (less the deltas already held, which the aggregate also
+# saw), so authors who posted before this existed don't get partial totals.
+# `flask rebuild-author-stats` recomputes every document in one aggregation
+# to repair drift.
+
+STATS_FIELDS = ("posts_count", "likes_count", "comments_count", "last_post_at")
+COUNT_FIELDS = ("posts_count", "likes_count", "comments_count")
+
+
+def _pipeline(match=None):
+    """posts -> one row per author, from the posts' own denormalized counters."""
+    pipeline = [{"$match": match}] if match else []
+    pipeline.append({"$group": {
+        "_id": "$author_id",
+        "posts_count": {"$sum": 1},
+        "likes_count": {"$sum": "$likes_count"},
+        "comments_count": {"$sum": "$comments_count"},
+        "last_post_at": {"$max": "$created_at"},
+    }})
+    return pipeline
+
+
+def _empty(author_id):
+    return {"_id": author_id, "posts_count": 0, "likes_count": 0, "comments_count": 0, "last_post_at": None}
+
+
+def _seed(author_id, held):
+    """Turn a missing or delta-only document into full totals; returns the stored document."""
+    rows = list(mongo.db.posts.aggregate(_pipeline({"author_id": author_id})))
+    computed = rows[0] if rows else _empty(author_id)
+    update = {
+        "$inc": {f: (computed.get(f) or 0) - (held.get(f) or 0) for f in COUNT_FIELDS},
+        "$set": {"seeded": True},
+    }
+    if computed.get("last_post_at"):
+        update["$max"] = {"last_post_at": computed["last_post_at"]}
+    try:
+        return mongo.db.author_stats.find_one_and_update(
+            {"_id": author_id, "seeded": {"$ne": True}}, update,
+            upsert=True, return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # another reader seeded it between our read and this update
+        return mongo.db.author_stats.find_one({"_id": author_id})
+
+
+## WRITE PATHS
+
+def record_posts(author_id, count, last_post_at):
+    """count new posts by author_id, the newest created at last_post_at."""
+    mongo.db.author_stats.update_one(
+        {"_id": str(author_id)},
+        {"$inc": {"posts_count": count}, "$max": {"last_post_at": last_post_at}},
+        upsert=True,
+    )
+
+
+def record_engagement(author_id, likes=0, comments=0):
+    """Likes / comments added (positive) or removed (negative) on one of author_id's posts."""
+    inc = {field: delta for field, delta in (("likes_count", likes), ("comments_count", comments)) if delta}
+    if author_id and inc:
+        mongo.db.author_stats.update_one({"_id": str(author_id)}, {"$inc": inc}, upsert=True)
+
+
+def record_post_deleted(post):
+    """Take a deleted post (the full document) and its counters off its author's totals."""
+    author_id = str(post.get("author_id"))
+    stats = mongo.db.author_stats.find_one_and_update(
+        {"_id": author_id},
+        {"$inc": {
+            "posts_count": -1,
+            "likes_count": -(post.get("likes_count") or 0),
+            "comments_count": -(post.get("comments_count") or 0),
+        }},
+        projection={"last_post_at": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    created_at = post.get("created_at")
+    if stats and created_at and stats.get("last_post_at") and created_at >= stats["last_post_at"]:
+        # it was the newest; author_feed_keyset makes finding the next one a single index seek
+        latest = mongo.db.posts.find_one(
+            {"author_id": author_id}, {"created_at": 1}, sort=[("created_at", DESCENDING), ("_id", DESCENDING)]
+        )
+        mongo.db.author_stats.update_one(
+            {"_id": author_id}, {"$set": {"last_post_at": latest["created_at"] if latest else None}}
+        )
+
+
+## READ
+
+class AuthorNotFound(Exception):
+    pass
+
+
+def get_author_stats(author_id):
+    """The author's stats document, seeded from their posts on first read. Raises AuthorNotFound."""
+    stats = mongo.db.author_stats.find_one({"_id": author_id})
+    if stats is not None and stats.get("seeded"):
+        return stats
+
+    try:
+        exists = mongo.db.users.find_one({"_id": ObjectId(author_id)}, {"_id": 1})
+    except Exception:
+        exists = None
+    if not exists:
+        raise AuthorNotFound()
+    return _seed(author_id, stats or {})
+
+
+## REBUILD
+
+def rebuild_author_stats(db):
+    """
+    Recompute every author's document from posts in one aggregation and
+    replace the collection with the result ($out). Authors without posts
+    drop out and are recomputed (as zeros) when next read.
+    Returns the number of authors written.
+    """
+    db.posts.aggregate(
+        _pipeline({"author_id": {"$ne": None}}) + [{"$addFields": {"seeded": True}}, {"$out": "author_stats"}],
+        allowDiskUse=True,
+    )
+    return db.author_stats.estimated_document_count()
@@ -0,0 +1,64 @@
+from bson.objectid import ObjectId
+from extensions import mongo, user_cache
+
+UNKNOWN = "Unknown"
+
+# What we cache per user; never the password or reset token fields.
+PROFILE_PROJECTION = {"username": 1, "email": 1, "created_at": 1}
+
+
+def _to_object_id(value):
+    try:
+        return ObjectId(str(value))
+    except Exception:
+        return None
+
+
+def get_profiles(user_ids):
+    """
+    Return {user_id_str: profile} for the given ids. Cached profiles are served
+    from user_cache; the rest are fetched with a single $in query.
+    """
+    ids = list({str(u) for u in user_ids if u})
+    if not ids:
+        return {}
+    profiles = user_cache.get_many(ids)
+
+    oids = [oid for oid in (_to_object_id(u) for u in ids if u not in profiles) if oid is not None]
+    if oids:
+        fetched = {}
+        for u in mongo.db.users.find({"_id": {"$in": oids}}, PROFILE_PROJECTION):
+            uid = str(u.pop("_id"))
+            fetched[uid] = u
+        user_cache.set_many(fetched)
+        profiles.update(fetched)
+    return profiles
+
+
+def get_profile(user_id):
+    return get_profiles([user_id]).get(str(user_id))
+
+
+def invalidate_user(user_id):
+    """Call from every code path that modifies a user document."""
+    user_cache.delete(str(user_id))
+
+
+def fetch_usernames(author_ids):
+    """Return {author_id_str: username} for every id."""
+    return {uid: p.get("username") or UNKNOWN for uid, p in get_profiles(author_ids).items()}
+
+
+def author_ref(author_id, usernames):
+    if not author_id:
+        return {"id": None, "username": UNKNOWN}
+    return {"id": str(author_id), "username": usernames.get(str(author_id), UNKNOWN)}
+
+
+def attach_authors(docs, key="author_id"):
+    """Fill in doc["author"] for every doc with at most one round trip to the users collection."""
+    docs = list(docs)
+    usernames = fetch_usernames(d.get(key) for d in docs)
+    for d in docs:
+        d["author"] = author_ref(d.get(key), usernames)
+    return docs
@@ -0,0 +1,230 @@
+import base64
+import datetime
+import json
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+
+## SHARED STORE ENCODING
+# Values go to the shared store as JSON, never pickle: anyone who can write
+# to that store must not be able to run code in the app. Datetimes (cached
+# profiles) and bytes (cached response bodies) are tagged; tuples come back
+# as lists.
+
+def _tag(obj):
+    if isinstance(obj, datetime.datetime):
+        return {"$date": obj.isoformat()}
+    if isinstance(obj, bytes):
+        return {"$bytes": base64.b64encode(obj).decode("ascii")}
+    raise TypeError(f"Object of type {type(obj).__name__} can't go in the shared cache")
+
+
+def _untag(obj):
+    if len(obj) == 1:
+        if "$date" in obj:
+            return datetime.datetime.fromisoformat(obj["$date"])
+        if "$bytes" in obj:
+            return base64.b64decode(obj["$bytes"])
+    return obj
+
+
+def dumps(value):
+    return json.dumps(value, default=_tag, separators=(",", ":"))
+
+
+def loads(blob):
+    return json.loads(blob, object_hook=_untag)
+
+
+class LocalBackend:
+    """
+    In-process stand-in for a Redis-style shared store (get/set with expiry,
+    mget, delete, incr, expire). Used when CACHE_BACKEND_URL=local, in tests
+    and benchmarks.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key, now):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires is not None and expires <= now:
+            self._data.pop(key, None)
+            return None
+        return value
+
+    def get(self, key):
+        with self._lock:
+            return self._live(key, time.monotonic())
+
+    def mget(self, keys):
+        now = time.monotonic()
+        with self._lock:
+            return [self._live(k, now) for k in keys]
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ex if ex else None)
+
+    def delete(self, *keys):
+        with self._lock:
+            for k in keys:
+                self._data.pop(k, None)
+
+    def incr(self, key, amount=1):
+        with self._lock:
+            now = time.monotonic()
+            value = int(self._live(key, now) or 0) + amount
+            expires = self._data[key][1] if key in self._data else None
+            self._data[key] = (value, expires)
+            return value
+
+    def expire(self, key, seconds):
+        with self._lock:
+            if self._live(key, time.monotonic()) is not None:
+                self._data[key] = (self._data[key][0], time.monotonic() + seconds)
+
+
+def make_backend(url):
+    """None -> no shared backend, "local" -> LocalBackend, redis://... -> redis client."""
+    if not url:
+        return None
+    if url == "local":
+        return LocalBackend()
+    import redis  # optional dependency, only needed for a real shared backend
+    return redis.Redis.from_url(url)
+
+
+class TTLCache:
+    """
+    Bounded LRU cache with per-entry TTL, optionally backed by a shared store
+    so other workers can reuse entries. Thread safe.
+    """
+
+    def __init__(self, name, maxsize=10000, ttl=300, backend=None, local_ttl=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.backend = backend
+        # With a shared backend, keep local copies short-lived so an
+        # invalidation in one worker reaches the others quickly.
+        self.local_ttl = local_ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def configure(self, maxsize=None, ttl=None, backend=MISSING, local_ttl=MISSING):
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+            if ttl is not None:
+                self.ttl = ttl
+            if local_ttl is not MISSING:
+                self.local_ttl = local_ttl
+            if backend is not MISSING:
+                self.backend = backend
+            self._data.clear()
+
+    def _backend_key(self, key):
+        return f"{self.name}:{key}"
+
+    def _get_local(self, key, now):
+        item = self._data.get(key)
+        if item is None:
+            return MISSING
+        value, expires = item
+        if expires <= now:
+            del self._data[key]
+            return MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def _set_local(self, key, value, now):
+        ttl = min(self.ttl, self.local_ttl) if self.local_ttl else self.ttl
+        self._data[key] = (value, now + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def get_many(self, keys):
+        """Return {key: value} for every key found; counts one hit or miss per key."""
+        found, missing = {}, []
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                value = self._get_local(key, now)
+                if value is MISSING:
+                    missing.append(key)
+                else:
+                    found[key] = value
+
+        if missing and self.backend is not None:
+            try:
+                raw = self.backend.mget([self._backend_key(k) for k in missing])
+            except Exception:
+                raw = [None] * len(missing)
+            with self._lock:
+                for key, blob in zip(missing, raw):
+                    if blob is None:
+                        continue
+                    try:
+                        found[key] = loads(blob)
+                    except ValueError:
+                        continue    # not ours (e.g. written by an older release); a miss
+                    self._set_local(key, found[key], now)
+
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, key, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def set_many(self, items):
+        now = time.monotonic()
+        with self._lock:
+            for key, value in items.items():
+                self._set_local(key, value, now)
+        if self.backend is not None:
+            for key, value in items.items():
+                try:
+                    self.backend.set(self._backend_key(key), dumps(value), ex=self.ttl)
+                except Exception:
+                    break
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+        if self.backend is not None:
+            try:
+                self.backend.delete(self._backend_key(key))
+            except Exception:
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
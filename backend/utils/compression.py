@@ -0,0 +1,62 @@
+import gzip
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip is offered
+    brotli = None
+
+# Response compression negotiated on Accept-Encoding. Skips small bodies,
+# streamed responses (comments ?stream=1) and files served by send_file.
+
+COMPRESSIBLE = {"application/json", "text/plain", "text/html", "text/css", "application/javascript", "image/svg+xml"}
+
+
+def _choose_encoding():
+    accept = request.accept_encodings
+    if brotli is not None and accept.quality("br") > 0:
+        return "br"
+    if accept.quality("gzip") > 0:
+        return "gzip"
+    return None
+
+
+def init_compression(app):
+    if not app.config.get("COMPRESS_ENABLED", True):
+        return
+
+    @app.after_request
+    def compress_response(response):
+        if response.mimetype not in COMPRESSIBLE:
+            return response
+        # the body can differ by Accept-Encoding even when this one isn't compressed
+        response.vary.add("Accept-Encoding")
+        if (
+            response.status_code < 200
+            or response.status_code in (204, 304)
+            or response.is_streamed
+            or response.direct_passthrough
+            or "Content-Encoding" in response.headers
+        ):
+            return response
+
+        data = response.get_data()
+        if len(data) < app.config.get("COMPRESS_MIN_SIZE", 1024):
+            return response
+        encoding = _choose_encoding()
+        if encoding is None:
+            return response
+
+        if encoding == "br":
+            body = brotli.compress(data, quality=app.config.get("COMPRESS_BROTLI_QUALITY", 4))
+        else:
+            body = gzip.compress(data, compresslevel=app.config.get("COMPRESS_LEVEL", 6))
+        response.set_data(body)
+        response.headers["Content-Encoding"] = encoding
+
+        # Same content, different bytes: a weak validator. If-None-Match is a
+        # weak comparison, so revalidating W/"x" still matches the view's "x".
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
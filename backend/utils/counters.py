@@ -0,0 +1,45 @@
+from pymongo import UpdateOne
+
+# posts carry denormalized counters kept up to date by the write paths:
+#   comments_count  <- add_comment / delete_comment
+#   likes_count     <- toggle_like
+# These functions recompute them from the source collections to repair drift
+# (crashes between the two writes, posts created before the counters existed).
+
+COUNTERS = {
+    "comments_count": "comments",
+    "likes_count": "likes",
+}
+
+
+def _counts(db, collection):
+    """{post_id: n} for every post with at least one row, in a single $group."""
+    pipeline = [{"$group": {"_id": "$post_id", "n": {"$sum": 1}}}]
+    return {row["_id"]: row["n"] for row in db[collection].aggregate(pipeline, allowDiskUse=True)}
+
+
+def reconcile_counters(db, fields=None, batch_size=500):
+    """
+    Recompute the post counters and fix the ones that drifted.
+    Returns {field: number of posts corrected}.
+    """
+    fields = fields or list(COUNTERS)
+    actual = {field: _counts(db, COUNTERS[field]) for field in fields}
+    fixed = {field: 0 for field in fields}
+
+    ops = []
+    for post in db.posts.find({}, {field: 1 for field in fields}):
+        updates = {}
+        for field in fields:
+            expected = actual[field].get(post["_id"], 0)
+            if post.get(field) != expected:
+                updates[field] = expected
+                fixed[field] += 1
+        if updates:
+            ops.append(UpdateOne({"_id": post["_id"]}, {"$set": updates}))
+        if len(ops) >= batch_size:
+            db.posts.bulk_write(ops, ordered=False)
+            ops = []
+    if ops:
+        db.posts.bulk_write(ops, ordered=False)
+    return fixed
@@ -0,0 +1,85 @@
+from flask import current_app
+from pymongo.read_preferences import Nearest, PrimaryPreferred, Secondary, SecondaryPreferred
+
+from extensions import mongo
+
+# MongoClient options from config. Only the keys that are set are passed, so
+# anything given in MONGO_URI's query string still applies.
+CLIENT_OPTIONS = {
+    "MONGO_MAX_POOL_SIZE": "maxPoolSize",
+    "MONGO_MIN_POOL_SIZE": "minPoolSize",
+    "MONGO_MAX_IDLE_TIME_MS": "maxIdleTimeMS",
+    "MONGO_WAIT_QUEUE_TIMEOUT_MS": "waitQueueTimeoutMS",
+    "MONGO_CONNECT_TIMEOUT_MS": "connectTimeoutMS",
+    "MONGO_SERVER_SELECTION_TIMEOUT_MS": "serverSelectionTimeoutMS",
+    "MONGO_SOCKET_TIMEOUT_MS": "socketTimeoutMS",
+    "MONGO_READ_PREFERENCE": "readPreference",
+    "MONGO_WRITE_CONCERN": "w",
+    "MONGO_WTIMEOUT_MS": "wTimeoutMS",
+}
+
+READ_PREFERENCES = {
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+# MongoDB rejects maxStalenessSeconds below 90
+MIN_MAX_STALENESS = 90
+
+
+def client_options(config):
+    options = {}
+    for key, option in CLIENT_OPTIONS.items():
+        value = config.get(key)
+        if value is None or value == "":
+            continue
+        if option == "w" and str(value).isdigit():
+            value = int(value)
+        options[option] = value
+    return options
+
+
+def check_read_routing(config):
+    """Fail at startup, not on the first read, when MONGO_READS_PREFERENCE is misspelled."""
+    mode = config.get("MONGO_READS_PREFERENCE")
+    if mode and mode != "primary" and mode not in READ_PREFERENCES:
+        choices = ", ".join(["primary", *READ_PREFERENCES])
+        raise ValueError(f"MONGO_READS_PREFERENCE must be one of {choices}, got {mode!r}")
+
+
+_read_db = None
+_read_db_for = None
+
+
+def read_db():
+    """
+    Database handle for read-only endpoints (list_posts, get_post,
+    get_comments, search_top). With MONGO_READS_PREFERENCE set to e.g.
+    secondaryPreferred these go to secondaries that are at most
+    MONGO_READS_MAX_STALENESS seconds behind; by default they use the
+    client's read preference like everything else.
+
+    Only use it where a slightly stale answer is fine: never to check a
+    document the same request (or the same user, a moment ago) just wrote.
+    """
+    global _read_db, _read_db_for
+    db = mongo.db
+    if _read_db_for is not db:
+        mode = current_app.config.get("MONGO_READS_PREFERENCE")
+        if not mode or mode == "primary":
+            _read_db = db
+        else:
+            staleness = current_app.config.get("MONGO_READS_MAX_STALENESS", -1)
+            if staleness != -1:
+                staleness = max(MIN_MAX_STALENESS, staleness)
+            pref = READ_PREFERENCES[mode](max_staleness=staleness)
+            _read_db = db.with_options(read_preference=pref)
+        _read_db_for = db
+    return _read_db
+
+
+def ping():
+    """Round trip to the server through the pool; raises on failure."""
+    return mongo.cx.admin.command("ping")
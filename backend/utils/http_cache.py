@@ -0,0 +1,110 @@
+import hashlib
+import threading
+from functools import wraps
+from flask import current_app, make_response, request
+
+import extensions
+from extensions import response_cache
+
+FEED = "feed"
+
+_generations = {}
+_gen_lock = threading.Lock()
+
+
+def version_etag(*parts):
+    """Strong ETag value from the version fields (ids, updated_at, counters) of a response."""
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+
+def post_namespace(post_id):
+    return f"post:{post_id}"
+
+
+def _generation(namespace):
+    backend = extensions.cache_backend
+    if backend is not None:
+        try:
+            return int(backend.get(f"gen:{namespace}") or 0)
+        except Exception:
+            pass
+    return _generations.get(namespace, 0)
+
+
+def _bump(namespace):
+    with _gen_lock:
+        _generations[namespace] = _generations.get(namespace, 0) + 1
+    backend = extensions.cache_backend
+    if backend is not None:
+        try:
+            backend.incr(f"gen:{namespace}")
+        except Exception:
+            current_app.logger.warning("could not bump cache generation for %s", namespace)
+
+
+def invalidate_feed():
+    _bump(FEED)
+
+
+def invalidate_post(post_id):
+    """A post changed: drop its own cached responses and every feed page that may show it."""
+    _bump(post_namespace(post_id))
+    _bump(FEED)
+
+
+def _is_anonymous():
+    return "Authorization" not in request.headers
+
+
+def _public_cache_control():
+    ttl = current_app.config.get("RESPONSE_CACHE_TTL", 30)
+    return f"public, max-age={ttl}, s-maxage={ttl}, stale-while-revalidate={ttl * 2}"
+
+
+def cached_get(namespace_for):
+    """
+    Conditional GET + server-side response cache for anonymous reads.
+
+    namespace_for(**view_kwargs) names the invalidation namespace. Anonymous
+    responses are cached under the namespace's current generation, so bumping
+    it (invalidate_feed / invalidate_post) makes every old entry unreachable.
+    Authenticated responses are never cached server side but still get ETags
+    and 304s. Views may set their own ETag; otherwise one is hashed from the body.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not _is_anonymous():
+                resp = make_response(view(*args, **kwargs))
+                if resp.status_code == 200 and not resp.get_etag()[0]:
+                    resp.add_etag()
+                resp.headers["Cache-Control"] = "private, no-cache"
+                resp.vary.add("Authorization")
+                return resp.make_conditional(request)
+
+            namespaces = namespace_for(**kwargs)
+            if isinstance(namespaces, str):
+                namespaces = (namespaces,)
+            gens = ":".join(f"{ns}={_generation(ns)}" for ns in namespaces)
+            key = f"{gens}:{request.full_path}"
+
+            entry = response_cache.get(key)
+            if entry is not None:
+                body, mimetype, etag = entry
+                resp = current_app.response_class(body, mimetype=mimetype)
+                resp.set_etag(etag)
+                resp.headers["X-Cache"] = "HIT"
+            else:
+                resp = make_response(view(*args, **kwargs))
+                if resp.status_code != 200:
+                    return resp
+                if not resp.get_etag()[0]:
+                    resp.add_etag()
+                response_cache.set(key, (resp.get_data(), resp.mimetype, resp.get_etag()[0]))
+                resp.headers["X-Cache"] = "MISS"
+
+            resp.headers["Cache-Control"] = _public_cache_control()
+            resp.vary.add("Authorization")
+            return resp.make_conditional(request)
+        return wrapper
+    return decorator
@@ -0,0 +1,267 @@
+import base64
+import datetime
+import io
+import os
+import uuid
+from flask import current_app
+from bson.objectid import ObjectId
+
+from extensions import mongo
+from utils import tasks
+from utils.http_cache import invalidate_post
+from utils.trending import refresh_trending_card
+
+UPLOAD_FOLDER = "blog_platform/posts"
+MAX_WIDTH = 1600
+
+# Responsive sizes made with every upload, name -> max width. They are stored
+# as image.variants ({url, width, height} each) with a ready srcset, so
+# listings can serve the right size without any further calls.
+DERIVATIVES = (("thumb", 320), ("card", 800), ("full", MAX_WIDTH))
+DERIVATIVE_FORMAT = "webp"
+DERIVATIVE_QUALITY = 80
+PLACEHOLDER_WIDTH = 16
+
+
+class CloudinaryBackend:
+    """Uploads to Cloudinary. The SDK is imported and configured on first use."""
+
+    def __init__(self):
+        self._uploader = None
+
+    def _get_uploader(self):
+        if self._uploader is None:
+            import cloudinary
+            import cloudinary.uploader
+            cloudinary.config(
+                cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
+                api_key=os.getenv("CLOUDINARY_API_KEY"),
+                api_secret=os.getenv("CLOUDINARY_API_SECRET"),
+                secure=True
+            )
+            self._uploader = cloudinary.uploader
+        return self._uploader
+
+    def upload(self, data, filename):
+        upload_result = self._get_uploader().upload(
+            io.BytesIO(data),
+            folder=UPLOAD_FOLDER,
+            filename_override=filename,
+            use_filename=True,
+            unique_filename=True,
+            resource_type="image",
+            transformation=[{"width": MAX_WIDTH, "crop": "limit"}],
+            # derived during the upload call; results come back in this order
+            eager=[
+                {"width": width, "crop": "limit", "format": DERIVATIVE_FORMAT, "quality": "auto"}
+                for _, width in DERIVATIVES
+            ],
+        )
+        eager = upload_result.get("eager") or []
+        variants = {
+            name: {"url": e.get("secure_url") or e.get("url"), "width": e.get("width"), "height": e.get("height")}
+            for (name, _), e in zip(DERIVATIVES, eager)
+        }
+        return {
+            "url": upload_result.get("secure_url") or upload_result.get("url"),
+            "public_id": upload_result.get("public_id"),
+            "width": upload_result.get("width"),
+            "height": upload_result.get("height"),
+            "size": upload_result.get("bytes"),
+            "format": upload_result.get("format"),
+            "variants": variants,
+        }
+
+    def destroy(self, public_id):
+        # also removes the eager derivatives
+        self._get_uploader().destroy(public_id, invalidate=True, resource_type="image")
+
+
+class LocalBackend:
+    """
+    Filesystem stand-in for Cloudinary, for tests, benchmarks and offline dev.
+    Files are written under IMAGE_LOCAL_DIR and served from /api/media/.
+    Derivatives are made with Pillow when it is installed; without it only
+    the original is stored.
+    """
+
+    def __init__(self, root, base_url="/api/media"):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+
+    def upload(self, data, filename):
+        ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else "bin"
+        public_id = f"{UPLOAD_FOLDER}/{uuid.uuid4().hex}"
+        path = os.path.join(self.root, f"{public_id}.{ext}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+
+        width = height = None
+        variants = {}
+        try:
+            from PIL import Image  # optional
+        except ImportError:
+            Image = None
+        if Image is not None:
+            try:
+                with Image.open(io.BytesIO(data)) as im:
+                    width, height = im.size
+                    variants = self._derive(im, public_id)
+            except Exception as e:
+                current_app.logger.warning("could not make derivatives for %s: %s", filename, e)
+
+        return {
+            "url": f"{self.base_url}/{public_id}.{ext}",
+            "public_id": f"{public_id}.{ext}",
+            "width": width,
+            "height": height,
+            "size": len(data),
+            "format": ext,
+            "variants": variants,
+        }
+
+    def _derive(self, im, base):
+        from PIL import Image, ImageOps
+        im = ImageOps.exif_transpose(im)
+        im = im.convert("RGBA" if "A" in im.getbands() else "RGB")
+        variants, previous = {}, None
+        for name, max_width in DERIVATIVES:
+            width = min(max_width, im.width)
+            if previous is not None and previous["width"] == width:
+                # no upscaling: a small original makes the bigger sizes identical
+                variants[name] = previous
+                continue
+            height = max(1, round(im.height * width / im.width))
+            rel = f"{base}_{name}.{DERIVATIVE_FORMAT}"
+            im.resize((width, height), Image.LANCZOS).save(
+                os.path.join(self.root, rel), format=DERIVATIVE_FORMAT.upper(), quality=DERIVATIVE_QUALITY
+            )
+            variants[name] = previous = {"url": f"{self.base_url}/{rel}", "width": width, "height": height}
+        return variants
+
+    def destroy(self, public_id):
+        base = public_id.rsplit(".", 1)[0]
+        paths = [public_id] + [f"{base}_{name}.{DERIVATIVE_FORMAT}" for name, _ in DERIVATIVES]
+        for path in paths:
+            try:
+                os.remove(os.path.join(self.root, path))
+            except FileNotFoundError:
+                pass
+
+
+_backends = {}
+
+
+def get_backend():
+    name = current_app.config.get("IMAGE_BACKEND", "cloudinary")
+    if name not in _backends:
+        if name == "local":
+            _backends[name] = LocalBackend(current_app.config.get("IMAGE_LOCAL_DIR", "media"))
+        else:
+            _backends[name] = CloudinaryBackend()
+    return _backends[name]
+
+
+def placeholder(data):
+    """
+    A PLACEHOLDER_WIDTH px wide webp as a data: URI, shown blurred while the
+    real image loads. None when Pillow is missing or can't read the image.
+    """
+    try:
+        from PIL import Image, ImageOps
+        with Image.open(io.BytesIO(data)) as im:
+            im = ImageOps.exif_transpose(im).convert("RGB")
+            im.thumbnail((PLACEHOLDER_WIDTH, PLACEHOLDER_WIDTH))
+            buf = io.BytesIO()
+            im.save(buf, format="WEBP", quality=40)
+    except Exception:
+        return None
+    return "data:image/webp;base64," + base64.b64encode(buf.getvalue()).decode("ascii")
+
+
+def srcset(variants):
+    """"url 320w, url 800w, ..." from image.variants, one entry per distinct width."""
+    by_width = {v["width"]: v["url"] for v in (variants or {}).values() if v.get("url") and v.get("width")}
+    return ", ".join(f"{url} {width}w" for width, url in sorted(by_width.items())) or None
+
+
+def pending_image(filename):
+    """Placeholder stored on the post until the worker fills in the upload result."""
+    return {"status": "pending", "upload_id": uuid.uuid4().hex, "filename": filename}
+
+
+## WORKER
+
+def _upload_job(post_id, upload_id, data, filename, old_public_id):
+    meta = get_backend().upload(data, filename)
+    meta["srcset"] = srcset(meta.get("variants"))
+    meta["placeholder"] = placeholder(data)
+    meta["status"] = "ready"
+    # the patch retries on its own: retrying this job would upload (and orphan) a second copy
+    cfg = current_app.config
+    tasks.submit(
+        _patch_job, post_id, upload_id, meta, old_public_id,
+        retries=cfg.get("IMAGE_UPLOAD_RETRIES", 3),
+        backoff=cfg.get("IMAGE_UPLOAD_BACKOFF", 2.0),
+        on_failure=_patch_failed(post_id, upload_id, meta["public_id"]),
+    )
+
+
+def _patch_job(post_id, upload_id, meta, old_public_id):
+    # Only patch if the post still waits for this exact upload; it may have
+    # been deleted or given a newer image while we were uploading.
+    # updated_at moves too: it is what the post and feed ETags are versioned on
+    res = mongo.db.posts.update_one(
+        {"_id": ObjectId(post_id), "image.upload_id": upload_id},
+        {"$set": {"image": meta, "updated_at": datetime.datetime.utcnow()}}
+    )
+    if not res.matched_count:
+        destroy_image(meta["public_id"])
+        return
+    invalidate_post(post_id)
+    # a trending card built while the image was pending still shows it that way
+    refresh_trending_card(post_id)
+    if old_public_id:
+        destroy_image(old_public_id)
+
+
+def _mark_failed(post_id, upload_id):
+    def on_failure(exc):
+        mongo.db.posts.update_one(
+            {"_id": ObjectId(post_id), "image.upload_id": upload_id},
+            {"$set": {
+                "image.status": "failed", "image.error": str(exc)[:200], "updated_at": datetime.datetime.utcnow(),
+            }}
+        )
+        invalidate_post(post_id)
+    return on_failure
+
+
+def _patch_failed(post_id, upload_id, public_id):
+    mark_failed = _mark_failed(post_id, upload_id)
+
+    def on_failure(exc):
+        destroy_image(public_id)
+        mark_failed(exc)
+    return on_failure
+
+
+def enqueue_upload(post_id, image_meta, data, old_public_id=None):
+    """Upload in the background and patch image metadata onto the post when done."""
+    cfg = current_app.config
+    tasks.submit(
+        _upload_job, str(post_id), image_meta["upload_id"], data, image_meta["filename"], old_public_id,
+        retries=cfg.get("IMAGE_UPLOAD_RETRIES", 3),
+        backoff=cfg.get("IMAGE_UPLOAD_BACKOFF", 2.0),
+        on_failure=_mark_failed(str(post_id), image_meta["upload_id"]),
+    )
+
+
+def _destroy_job(public_id):
+    get_backend().destroy(public_id)
+
+
+def destroy_image(public_id):
+    """Delete a stored image in the background; failures are logged, never raised."""
+    tasks.submit(_destroy_job, public_id, retries=2, backoff=2.0)
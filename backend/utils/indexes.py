@@ -0,0 +1,152 @@
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import ConnectionFailure
+
+# Every index the app relies on: collection -> list of (keys, options).
+# Add new query shapes to QUERY_SHAPES below so `flask audit-queries` covers them.
+INDEXES = {
+    "users": [
+        ([("email", ASCENDING)], {"name": "email_unique", "unique": True}),
+        # the handful of fanout_on_read authors, see utils/timelines.py
+        ([("fanout_on_read", ASCENDING)], {"name": "fanout_on_read", "partialFilterExpression": {"fanout_on_read": True}}),
+    ],
+    "posts": [
+        ([("created_at", DESCENDING), ("_id", DESCENDING)], {"name": "feed_keyset"}),
+        ([("author_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {"name": "author_feed_keyset"}),
+        # search index catch-up: posts edited since the last sync
+        ([("updated_at", DESCENDING)], {"name": "updated_at"}),
+    ],
+    "comments": [
+        ([("post_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {"name": "post_comments"}),
+    ],
+    "likes": [
+        ([("post_id", ASCENDING), ("user_id", ASCENDING)], {"name": "post_user_unique", "unique": True}),
+    ],
+    "follows": [
+        ([("follower_id", ASCENDING), ("followee_id", ASCENDING)], {"name": "follower_followee_unique", "unique": True}),
+        ([("followee_id", ASCENDING)], {"name": "followers"}),
+    ],
+    "mail_outbox": [
+        ([("status", ASCENDING), ("next_attempt_at", ASCENDING)], {"name": "due"}),
+        (
+            [("dedupe_key", ASCENDING)],
+            {"name": "pending_dedupe", "unique": True, "partialFilterExpression": {"status": "pending"}},
+        ),
+        ([("sent_at", ASCENDING)], {"name": "sent_ttl", "expireAfterSeconds": 7 * 24 * 3600}),
+    ],
+}
+
+_SAMPLE_ID = ObjectId()
+
+# One entry per query an endpoint issues: (endpoint, collection, filter, sort)
+QUERY_SHAPES = [
+    ("auth.register/login", "users", {"email": "audit@example.com"}, None),
+    ("posts.list_posts", "posts", {}, [("created_at", -1), ("_id", -1)]),
+    ("posts.list_posts[cursor]", "posts",
+     {"$or": [{"created_at": {"$lt": _SAMPLE_ID.generation_time}},
+              {"created_at": _SAMPLE_ID.generation_time, "_id": {"$lt": _SAMPLE_ID}}]},
+     [("created_at", -1), ("_id", -1)]),
+    ("posts.list_posts[author]", "posts", {"author_id": str(_SAMPLE_ID)}, [("created_at", -1), ("_id", -1)]),
+    ("posts.get_post", "posts", {"_id": _SAMPLE_ID}, None),
+    ("search.sync", "posts",
+     {"$or": [{"created_at": {"$gt": _SAMPLE_ID.generation_time}},
+              {"updated_at": {"$gt": _SAMPLE_ID.generation_time}}]}, None),
+    ("trending.build", "posts", {"created_at": {"$gte": _SAMPLE_ID.generation_time}}, None),
+    ("posts.get_comments", "comments", {"post_id": _SAMPLE_ID}, [("created_at", -1), ("_id", -1)]),
+    ("posts.is_liked", "likes", {"post_id": {"$in": [_SAMPLE_ID]}, "user_id": str(_SAMPLE_ID)}, None),
+    ("authors.fetch_usernames", "users", {"_id": {"$in": [_SAMPLE_ID]}}, None),
+    ("author_stats.compute", "posts", {"author_id": str(_SAMPLE_ID)}, None),
+    ("timelines.fan_out", "follows", {"followee_id": str(_SAMPLE_ID)}, None),
+    ("timelines.followed_celebrities", "follows",
+     {"follower_id": str(_SAMPLE_ID), "followee_id": {"$in": [str(_SAMPLE_ID)]}}, None),
+    ("timelines.celebrity_ids", "users", {"fanout_on_read": True}, None),
+    ("mailer.claim", "mail_outbox", {"status": "pending", "next_attempt_at": {"$lte": _SAMPLE_ID.generation_time}},
+     [("next_attempt_at", 1)]),
+]
+
+
+class CollectionScanError(RuntimeError):
+    pass
+
+
+def ensure_indexes(db, logger=None):
+    """Create every declared index. create_index is a no-op when the index already exists."""
+    failed = []
+    for collection, specs in INDEXES.items():
+        for keys, options in specs:
+            try:
+                name = db[collection].create_index(keys, **options)
+            except ConnectionFailure as e:
+                # no point trying the rest against an unreachable server
+                if logger:
+                    logger.error("cannot ensure indexes, database unreachable: %s", e)
+                return failed + [(collection, options.get("name"), e)]
+            except Exception as e:
+                # e.g. duplicate emails blocking the unique index; keep going with the rest
+                failed.append((collection, options.get("name"), e))
+                if logger:
+                    logger.error("failed to create index %s.%s: %s", collection, options.get("name"), e)
+                continue
+            if logger:
+                logger.debug("ensured index %s.%s", collection, name)
+    return failed
+
+
+def _plan_stages(plan):
+    """Yield every stage name in an explain() plan tree."""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _plan_stages(item)
+
+
+def explain_shape(db, collection, filt, sort=None):
+    cursor = db[collection].find(filt)
+    if sort:
+        cursor = cursor.sort(sort)
+    explain = cursor.explain()
+    return list(_plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {})))
+
+
+def audit_query_plans(db, logger=None):
+    """
+    Run explain() on every QUERY_SHAPES entry.
+    Returns a list of (endpoint, stages, error) for shapes that scan the whole
+    collection or cannot be planned at all (e.g. $text without a text index).
+    """
+    problems = []
+    for endpoint, collection, filt, sort in QUERY_SHAPES:
+        try:
+            stages = explain_shape(db, collection, filt, sort)
+        except Exception as e:
+            problems.append((endpoint, [], e))
+            continue
+        if "COLLSCAN" in stages:
+            problems.append((endpoint, stages, None))
+        elif logger:
+            logger.debug("query plan ok for %s: %s", endpoint, " <- ".join(stages))
+    if logger:
+        for endpoint, stages, error in problems:
+            logger.warning("query plan problem for %s: %s", endpoint, error or " <- ".join(stages))
+    return problems
+
+
+def bootstrap_indexes(app, db):
+    """
+    Startup hook. ENSURE_INDEXES=1 (default) creates the registry; INDEX_AUDIT
+    is off (default), warn or fail. In fail mode any COLLSCAN aborts startup.
+    """
+    if app.config.get("ENSURE_INDEXES", True):
+        ensure_indexes(db, app.logger)
+
+    mode = (app.config.get("INDEX_AUDIT") or "off").lower()
+    if mode == "off":
+        return
+    problems = audit_query_plans(db, app.logger)
+    if problems and mode == "fail":
+        names = ", ".join(p[0] for p in problems)
+        raise CollectionScanError(f"queries without a usable index: {names}")
@@ -0,0 +1,93 @@
+import datetime
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from extensions import mongo
+from utils.author_stats import record_engagement
+
+
+class PostNotFound(Exception):
+    pass
+
+
+def liked_post_ids(user_id, post_ids):
+    """Set of post ids (as str) the user has liked, out of post_ids, in one query."""
+    if not user_id or not post_ids:
+        return set()
+    cursor = mongo.db.likes.find(
+        {"post_id": {"$in": list(post_ids)}, "user_id": user_id},
+        {"post_id": 1, "_id": 0},
+    )
+    return {str(l["post_id"]) for l in cursor}
+
+
+def is_liked(user_id, post_id):
+    return str(post_id) in liked_post_ids(user_id, [post_id])
+
+
+def _bump(post_id, delta):
+    return mongo.db.posts.find_one_and_update(
+        {"_id": post_id},
+        {"$inc": {"likes_count": delta}},
+        projection={"likes_count": 1, "author_id": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def toggle_like(post_id, user_id):
+    """
+    Flip the (post_id, user_id) like and keep posts.likes_count and the
+    author's total (utils/author_stats.py) in step.
+    Returns (liked, likes_count). Raises PostNotFound.
+    """
+    # Unlike: the delete itself tells us whether the like existed.
+    if mongo.db.likes.delete_one({"post_id": post_id, "user_id": user_id}).deleted_count:
+        post = _bump(post_id, -1)
+        if not post:
+            raise PostNotFound()
+        record_engagement(post.get("author_id"), likes=-1)
+        return False, post.get("likes_count", 0)
+
+    # Like: bumping the counter doubles as the existence check for the post.
+    post = _bump(post_id, 1)
+    if not post:
+        raise PostNotFound()
+    try:
+        mongo.db.likes.insert_one({
+            "post_id": post_id,
+            "user_id": user_id,
+            "created_at": datetime.datetime.utcnow(),
+        })
+    except DuplicateKeyError:
+        # A concurrent request liked it first; undo our increment.
+        post = _bump(post_id, -1)
+        if not post:
+            # and the post was deleted meanwhile
+            raise PostNotFound()
+    else:
+        record_engagement(post.get("author_id"), likes=1)
+    return True, post.get("likes_count", 0)
+
+
+def delete_post_likes(post_id):
+    mongo.db.likes.delete_many({"post_id": post_id})
+
+
+def migrate_embedded_likes(db, batch_size=500):
+    """Move legacy posts.likes arrays into the likes collection. Safe to re-run."""
+    moved = 0
+    for post in db.posts.find({"likes": {"$exists": True}}, {"likes": 1, "created_at": 1}):
+        user_ids = list(dict.fromkeys(post.get("likes") or []))
+        for i in range(0, len(user_ids), batch_size):
+            docs = [
+                {"post_id": post["_id"], "user_id": uid, "created_at": post.get("created_at")}
+                for uid in user_ids[i:i + batch_size]
+            ]
+            try:
+                db.likes.insert_many(docs, ordered=False)
+            except BulkWriteError:
+                # duplicates from a previous partial run are expected
+                pass
+        count = db.likes.count_documents({"post_id": post["_id"]})
+        db.posts.update_one({"_id": post["_id"]}, {"$set": {"likes_count": count}, "$unset": {"likes": ""}})
+        moved += 1
+    return moved
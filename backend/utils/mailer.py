@@ -0,0 +1,241 @@
+import datetime
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from extensions import mongo
+
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+## TRANSPORTS
+
+class SendGridTransport:
+    def __init__(self, api_key, from_email, from_name=None):
+        self.api_key = api_key
+        self.from_email = from_email
+        self.from_name = from_name
+
+    def send(self, to, subject, html):
+        # imported here so processes that never send mail don't pay for it
+        from sendgrid import SendGridAPIClient
+        from sendgrid.helpers.mail import Mail
+        message = Mail(
+            from_email=(self.from_email, self.from_name),
+            to_emails=to,
+            subject=subject,
+            html_content=html
+        )
+        resp = SendGridAPIClient(self.api_key).send(message)
+        if resp.status_code >= 300:
+            raise RuntimeError(f"SendGrid returned {resp.status_code}")
+        return resp.status_code
+
+
+class ConsoleTransport:
+    """Logs instead of sending; the default when SENDGRID_API_KEY is not set."""
+
+    def send(self, to, subject, html):
+        current_app.logger.warning("mail transport is console, not sending %r to %s", subject, to)
+        current_app.logger.info("mail body:\n%s", html)
+
+
+class MemoryTransport:
+    """Fake transport for tests and benchmarks; keeps every message in .sent."""
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, to, subject, html):
+        self.sent.append({"to": to, "subject": subject, "html": html})
+
+
+_transport = None
+
+
+def get_transport():
+    global _transport
+    if _transport is None:
+        name = current_app.config.get("MAIL_TRANSPORT")
+        api_key = os.getenv("SENDGRID_API_KEY")
+        if name == "memory":
+            _transport = MemoryTransport()
+        elif name == "console" or not api_key:
+            _transport = ConsoleTransport()
+        else:
+            _transport = SendGridTransport(api_key, os.getenv("FROM_EMAIL"), os.getenv("FROM_NAME"))
+    return _transport
+
+
+## OUTBOX
+
+def enqueue(to, subject, html, kind="generic", dedupe_key=None):
+    """
+    Write a message to the mail_outbox collection and wake the dispatcher.
+    A still-pending message with the same dedupe_key is replaced rather than
+    duplicated, so only the newest one goes out.
+    """
+    now = _now()
+    content = {"to": to, "subject": subject, "html": html, "next_attempt_at": now, "updated_at": now}
+    on_insert = {"kind": kind, "status": PENDING, "attempts": 0, "created_at": now}
+    outbox = mongo.db.mail_outbox
+
+    if dedupe_key:
+        on_insert["dedupe_key"] = dedupe_key
+        try:
+            outbox.update_one(
+                {"dedupe_key": dedupe_key, "status": PENDING},
+                {"$set": content, "$setOnInsert": on_insert},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # lost an upsert race with an identical request; the other one wins
+            pass
+    else:
+        outbox.insert_one({**content, **on_insert})
+
+    dispatcher.wake(current_app._get_current_object())
+
+
+class Dispatcher:
+    """
+    Per-process background sender. A single thread claims due messages from
+    the outbox (atomically, so several workers can share one outbox) and hands
+    them to a bounded thread pool. Started after fork, on each process's first
+    request (start_dispatcher); enqueue() only wakes it early.
+    """
+
+    def __init__(self):
+        self._thread = None
+        self._pool = None
+        self._slots = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self.app = None
+
+    def wake(self, app):
+        if app.config.get("BACKGROUND_TASKS_EAGER"):
+            self.app = app
+            self.drain(block=True)
+            return
+        self._ensure_started(app)
+        self._event.set()
+
+    def _ensure_started(self, app):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self.app = app
+            workers = app.config.get("MAIL_WORKERS", 2)
+            self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mail")
+            self._slots = threading.BoundedSemaphore(workers)
+            self._thread = threading.Thread(target=self._loop, name="mail-dispatcher", daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        interval = self.app.config.get("MAIL_POLL_INTERVAL", 30)
+        while True:
+            try:
+                self.drain()
+            except Exception:
+                self.app.logger.exception("mail dispatcher iteration failed")
+            self._event.wait(interval)
+            self._event.clear()
+
+    def _claim(self):
+        now = _now()
+        lease = datetime.timedelta(seconds=self.app.config.get("MAIL_LEASE_SECONDS", 120))
+        return mongo.db.mail_outbox.find_one_and_update(
+            {"$or": [
+                {"status": PENDING, "next_attempt_at": {"$lte": now}},
+                # a worker died mid-send; take the message over once its lease runs out
+                {"status": SENDING, "locked_until": {"$lt": now}},
+            ]},
+            {"$set": {"status": SENDING, "locked_until": now + lease}, "$inc": {"attempts": 1}},
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def drain(self, block=False):
+        """Claim and send every due message. Returns the number claimed."""
+        claimed = 0
+        while True:
+            if not block:
+                self._slots.acquire()
+            doc = self._claim()
+            if doc is None:
+                if not block:
+                    self._slots.release()
+                return claimed
+            claimed += 1
+            if block:
+                self._deliver(doc)
+            else:
+                self._pool.submit(self._deliver_and_release, doc)
+
+    def _deliver_and_release(self, doc):
+        try:
+            self._deliver(doc)
+        finally:
+            self._slots.release()
+
+    def _deliver(self, doc):
+        app = self.app
+        with app.app_context():
+            try:
+                get_transport().send(doc["to"], doc["subject"], doc["html"])
+            except Exception as e:
+                self._failed(doc, e)
+                return
+            # the body may hold a live reset link; don't keep it around
+            mongo.db.mail_outbox.update_one(
+                {"_id": doc["_id"]},
+                {"$set": {"status": SENT, "sent_at": _now()}, "$unset": {"html": "", "locked_until": ""}}
+            )
+
+    def _failed(self, doc, error):
+        app = self.app
+        attempts = doc.get("attempts", 1)
+        if attempts >= app.config.get("MAIL_MAX_ATTEMPTS", 5):
+            app.logger.error("giving up on mail %s to %s after %d attempts: %s", doc["_id"], doc["to"], attempts, error)
+            update = {"$set": {"status": FAILED, "last_error": str(error)[:500]}, "$unset": {"html": "", "locked_until": ""}}
+        else:
+            delay = app.config.get("MAIL_RETRY_BACKOFF", 30) * (2 ** (attempts - 1))
+            app.logger.warning("mail %s failed (%s), retrying in %ss", doc["_id"], error, delay)
+            update = {"$set": {
+                "status": PENDING,
+                "next_attempt_at": _now() + datetime.timedelta(seconds=delay),
+                "last_error": str(error)[:500],
+            }, "$unset": {"locked_until": ""}}
+        try:
+            mongo.db.mail_outbox.update_one({"_id": doc["_id"]}, update)
+        except DuplicateKeyError:
+            # a newer message with the same dedupe_key is already pending; it supersedes this one
+            mongo.db.mail_outbox.update_one(
+                {"_id": doc["_id"]},
+                {"$set": {"status": "superseded"}, "$unset": {"html": "", "locked_until": ""}}
+            )
+
+
+dispatcher = Dispatcher()
+
+
+def start_dispatcher(app, db):
+    """
+    Deferred startup hook (utils/startup.py): start this process's dispatcher
+    so messages left pending by a previous deploy or a dead worker go out
+    without waiting for a new enqueue() to wake it.
+    """
+    dispatcher.wake(app)
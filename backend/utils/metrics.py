@@ -0,0 +1,304 @@
+import threading
+import time
+from bisect import bisect_left
+from flask import current_app, g, has_request_context, request
+from pymongo import monitoring
+
+# Minimal Prometheus-style metrics (no client library needed) plus a pymongo
+# CommandListener that attributes every Mongo command to the Flask request
+# running on the same thread.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _label_str(names, values):
+    if not names:
+        return ""
+    pairs = ",".join('%s="%s"' % (n, str(v).replace("\\", "\\\\").replace('"', '\\"')) for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, v in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_str(self.labels, values)} {v}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(label_values)
+            if row is None:
+                row = self._values[label_values] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        with self._lock:
+            for values, row in sorted(self._values.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets, row):
+                    cumulative += n
+                    lines.append(f"{self.name}_bucket{_label_str(names, values + (bound,))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_label_str(names, values + ('+Inf',))} {row[-1]}")
+                lines.append(f"{self.name}_sum{_label_str(self.labels, values)} {row[-2]}")
+                lines.append(f"{self.name}_count{_label_str(self.labels, values)} {row[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, *args, **kwargs):
+        m = Counter(*args, **kwargs)
+        self._metrics.append(m)
+        return m
+
+    def histogram(self, *args, **kwargs):
+        m = Histogram(*args, **kwargs)
+        self._metrics.append(m)
+        return m
+
+    def register_collector(self, fn):
+        """fn() -> list of (name, type, help, {labels tuple: value}) read at scrape time."""
+        self._collectors.append(fn)
+
+    def render(self):
+        lines = []
+        for m in self._metrics:
+            lines.extend(m.render())
+        for fn in self._collectors:
+            for name, kind, help, samples in fn():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples.items():
+                    lines.append(f"{name}{_label_str(*labels) if labels else ''} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.counter("http_requests_total", "HTTP requests", ("route", "method", "status"))
+http_latency = registry.histogram("http_request_duration_seconds", "Request latency", ("route", "method"))
+db_queries = registry.histogram(
+    "db_queries_per_request", "Mongo commands issued per request", ("route", "method"), buckets=COUNT_BUCKETS
+)
+db_time = registry.histogram("db_time_per_request_seconds", "Time spent in Mongo per request", ("route", "method"))
+mongo_commands = registry.counter("mongo_commands_total", "Mongo commands", ("command", "outcome"))
+mongo_latency = registry.histogram("mongo_command_duration_seconds", "Mongo command latency", ("command",))
+mongo_slow = registry.counter("mongo_slow_commands_total", "Mongo commands slower than the slow threshold", ("command", "collection"))
+
+
+## MONGO COMMAND LISTENER
+
+class _RequestStats:
+    __slots__ = ("queries", "db_seconds", "pending")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.pending = {}
+
+
+class CommandCollector(monitoring.CommandListener):
+    def __init__(self, slow_ms=100, logger=None):
+        self.slow_ms = slow_ms
+        self.logger = logger
+        self._local = threading.local()
+
+    # request scoping, driven by the Flask hooks below
+    def begin(self):
+        self._local.stats = _RequestStats()
+
+    def end(self):
+        stats = getattr(self._local, "stats", None)
+        self._local.stats = None
+        return stats
+
+    def started(self, event):
+        stats = getattr(self._local, "stats", None)
+        if stats is not None:
+            stats.pending[event.request_id] = event.command.get(event.command_name)
+
+    def _finish(self, event, outcome):
+        seconds = event.duration_micros / 1e6
+        mongo_commands.inc(event.command_name, outcome)
+        mongo_latency.observe(seconds, event.command_name)
+        stats = getattr(self._local, "stats", None)
+        collection = None
+        if stats is not None:
+            collection = stats.pending.pop(event.request_id, None)
+            stats.queries += 1
+            stats.db_seconds += seconds
+        if seconds * 1000 >= self.slow_ms:
+            coll = collection if isinstance(collection, str) else ""
+            mongo_slow.inc(event.command_name, coll)
+            if self.logger:
+                self.logger.warning(
+                    "slow mongo command %s %s took %.1fms (%s)", event.command_name, coll, seconds * 1000,
+                    request.path if has_request_context() else "background"
+                )
+
+    def succeeded(self, event):
+        self._finish(event, "ok")
+
+    def failed(self, event):
+        self._finish(event, "error")
+
+
+command_collector = CommandCollector()
+
+
+## CONNECTION POOL LISTENER
+
+pool_checkouts = registry.counter("mongo_pool_checkouts_total", "Connection checkouts", ("outcome",))
+pool_wait = registry.histogram("mongo_pool_wait_seconds", "Time spent waiting for a pooled connection")
+
+
+class PoolCollector(monitoring.ConnectionPoolListener):
+    """Checkout counts and wait time, plus open / in-use connection gauges."""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.open = 0
+        self.in_use = 0
+
+    def _add(self, attr, delta):
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + delta)
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def _waited(self):
+        started = getattr(self._local, "started", None)
+        self._local.started = None
+        return time.perf_counter() - started if started is not None else None
+
+    def connection_checked_out(self, event):
+        waited = self._waited()
+        if waited is not None:
+            pool_wait.observe(waited)
+        pool_checkouts.inc("ok")
+        self._add("in_use", 1)
+
+    def connection_check_out_failed(self, event):
+        self._waited()
+        pool_checkouts.inc(str(event.reason))
+
+    def connection_checked_in(self, event):
+        self._add("in_use", -1)
+
+    def connection_created(self, event):
+        self._add("open", 1)
+
+    def connection_closed(self, event):
+        self._add("open", -1)
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def collect(self):
+        return [
+            ("mongo_pool_connections", "gauge", "Open pooled connections", {(): self.open}),
+            ("mongo_pool_connections_in_use", "gauge", "Pooled connections checked out", {(): self.in_use}),
+        ]
+
+
+pool_collector = PoolCollector()
+registry.register_collector(pool_collector.collect)
+
+
+def _cache_stats():
+    # reads the extension singletons, so one registration serves every app
+    from extensions import response_cache, user_cache
+    caches = {"users": user_cache.stats(), "responses": response_cache.stats()}
+    families = []
+    for field, name, kind in (
+        ("hits", "cache_hits_total", "counter"),
+        ("misses", "cache_misses_total", "counter"),
+        ("evictions", "cache_evictions_total", "counter"),
+        ("size", "cache_entries", "gauge"),
+    ):
+        samples = {(("cache",), (cache,)): stats[field] for cache, stats in caches.items()}
+        families.append((name, kind, f"In-process cache {field}", samples))
+    return families
+
+
+registry.register_collector(_cache_stats)
+
+
+## FLASK HOOKS
+
+def init_metrics(app):
+    command_collector.slow_ms = app.config.get("MONGO_SLOW_MS", 100)
+    command_collector.logger = app.logger
+
+    @app.before_request
+    def _start_request_metrics():
+        g._metrics_start = time.perf_counter()
+        command_collector.begin()
+
+    @app.after_request
+    def _record_request_metrics(response):
+        start = g.pop("_metrics_start", None)
+        stats = command_collector.end()
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        method = request.method
+        http_requests.inc(route, method, response.status_code)
+        http_latency.observe(elapsed, route, method)
+        if stats is not None:
+            db_queries.observe(stats.queries, route, method)
+            db_time.observe(stats.db_seconds, route, method)
+        if current_app.config.get("SERVER_TIMING") and stats is not None:
+            response.headers["Server-Timing"] = (
+                f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries", '
+                f"app;dur={elapsed * 1000:.1f}"
+            )
+        return response
+
+    @app.route("/api/metrics")
+    def metrics():
+        return registry.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
@@ -0,0 +1,53 @@
+import base64
+import datetime
+import json
+from bson.objectid import ObjectId
+
+DEFAULT_PER_PAGE = 10
+MAX_PER_PAGE = 50
+# legacy ?page= only: deeper pages must follow next_cursor instead of skipping
+MAX_SKIP = 1000
+
+
+def parse_int(value, default, minimum=1, maximum=None):
+    try:
+        n = int(value)
+    except (TypeError, ValueError):
+        return default
+    n = max(minimum, n)
+    if maximum is not None:
+        n = min(n, maximum)
+    return n
+
+
+def encode_cursor(created_at, doc_id):
+    """Opaque token for the (created_at, _id) position of the last item on a page."""
+    raw = json.dumps({"t": created_at.isoformat(), "id": str(doc_id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token):
+    """Inverse of encode_cursor. Raises ValueError on anything malformed."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.datetime.fromisoformat(data["t"]), ObjectId(data["id"])
+    except Exception as e:
+        raise ValueError("invalid cursor") from e
+
+
+def keyset_filter(created_at, last_id, field="created_at"):
+    """Documents strictly after (created_at, _id) in a (field desc, _id desc) ordering."""
+    return {"$or": [
+        {field: {"$lt": created_at}},
+        {field: created_at, "_id": {"$lt": last_id}},
+    ]}
+
+
+def next_cursor(docs, per_page, field="created_at"):
+    """Given up to per_page + 1 docs, trim the lookahead and return (docs, cursor)."""
+    if len(docs) <= per_page:
+        return docs, None
+    docs = docs[:per_page]
+    last = docs[-1]
+    return docs, encode_cursor(last[field], last["_id"])
@@ -0,0 +1,217 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, jsonify, request
+
+import extensions
+from utils.metrics import registry
+
+# Per-route limits keyed by client IP, user or any other request attribute.
+# Limits are "N/second|minute|hour" strings, overridable per deployment as
+# RATELIMIT_<NAME>_<SCOPE> (e.g. RATELIMIT_LOGIN_IP=50/minute).
+#
+# Without a shared store every worker enforces its own token buckets. With
+# CACHE_BACKEND_URL set, counts go through the shared backend as a sliding
+# window (two fixed-window counters), so a limit holds across workers.
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600}
+MAX_LOCAL_KEYS = 100000
+
+rejections = registry.counter("ratelimit_rejections_total", "Requests rejected by a rate limit", ("limit", "scope"))
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after=1):
+        super().__init__("rate limit exceeded")
+        self.retry_after = retry_after
+
+
+def parse_limit(spec):
+    """"10/minute" -> (10, 60); None for empty / "0" (no limit)."""
+    if not spec or spec == "0":
+        return None
+    count, _, period = str(spec).partition("/")
+    try:
+        return int(count), PERIODS[period.strip() or "second"]
+    except (KeyError, ValueError):
+        raise ValueError(f"bad rate limit {spec!r}, expected N/second|minute|hour") from None
+
+
+def check_limits(config):
+    """Fail at startup, not with a 500 on every request, when a RATELIMIT_* override is malformed."""
+    for key, value in config.items():
+        if not key.startswith("RATELIMIT_") or key in ("RATELIMIT_ENABLED", "RATELIMIT_STORAGE"):
+            continue
+        try:
+            if key.endswith("_INFLIGHT"):
+                int(value or 0)
+            else:
+                parse_limit(value)
+        except ValueError as e:
+            raise ValueError(f"{key}: {e}") from None
+
+
+class LocalBuckets:
+    """Token buckets in this process: capacity `count`, refilled at count/period per second."""
+
+    def __init__(self, maxsize=MAX_LOCAL_KEYS):
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.maxsize = maxsize
+
+    def hit(self, key, count, period):
+        rate = count / period
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (count, now))
+            tokens = min(count, tokens + (now - last) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                retry_after = 0
+            else:
+                retry_after = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                # least recently seen keys are the ones that have refilled longest
+                self._buckets.popitem(last=False)
+        return retry_after == 0, retry_after
+
+
+class SharedWindow:
+    """Sliding-window estimate over a Redis-style backend (incr, expire, get)."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def hit(self, key, count, period):
+        now = time.time()
+        window = int(now // period)
+        current_key = f"rl:{key}:{window}"
+        current = self.backend.incr(current_key)
+        if current == 1:
+            self.backend.expire(current_key, period * 2)
+        previous = int(self.backend.get(f"rl:{key}:{window - 1}") or 0)
+        elapsed = now / period - window
+        if previous * (1 - elapsed) + current <= count:
+            return True, 0
+        return False, period * (1 - elapsed)
+
+
+local_buckets = LocalBuckets()
+
+
+def _limiter():
+    backend = extensions.cache_backend
+    if backend is not None and current_app.config.get("RATELIMIT_STORAGE", "shared") == "shared":
+        return SharedWindow(backend)
+    return local_buckets
+
+
+def client_ip():
+    # behind a proxy this is the client only with PROXY_FIX_X_FOR set (ProxyFix, see app.py)
+    return request.remote_addr or "unknown"
+
+
+def jwt_user():
+    from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+    try:
+        verify_jwt_in_request(optional=True)
+        return get_jwt_identity()
+    except Exception:
+        return None
+
+
+def json_field(name):
+    """Scope on a (lower-cased) field of the JSON body, e.g. the email being logged into."""
+    def get():
+        value = (request.get_json(silent=True) or {}).get(name)
+        return value.strip().lower() if isinstance(value, str) and value.strip() else None
+    return get
+
+
+SCOPES = {"ip": client_ip, "user": jwt_user}
+
+
+def _check(name, scopes):
+    config = current_app.config
+    limiter = _limiter()
+    for scope, default in scopes.items():
+        limit = parse_limit(config.get(f"RATELIMIT_{name.upper()}_{scope.upper()}", default))
+        if limit is None:
+            continue
+        ident = SCOPES[scope]() if scope in SCOPES else json_field(scope)()
+        if ident is None:
+            continue
+        key = f"{name}:{scope}:{ident}"
+        try:
+            allowed, retry_after = limiter.hit(key, *limit)
+        except Exception as e:
+            # shared store down: fall back to this worker's own buckets rather than fail open or closed
+            current_app.logger.warning("rate limit backend failed (%s), using local buckets", e)
+            allowed, retry_after = local_buckets.hit(key, *limit)
+        if not allowed:
+            rejections.inc(name, scope)
+            raise RateLimited(max(1, math.ceil(retry_after)))
+
+
+def rate_limit(name, **scopes):
+    """
+    Decorator. Each keyword is a scope and its default limit:
+        @rate_limit("login", ip="30/minute", email="10/minute")
+    "ip" and "user" (JWT identity, if any) are built in; any other scope
+    name is read from that field of the JSON body. A request is rejected
+    when any of its scopes is over the limit.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if current_app.config.get("RATELIMIT_ENABLED", True):
+                _check(name, scopes)
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class InflightLimit:
+    """
+    Load shedding: at most RATELIMIT_<NAME>_INFLIGHT concurrent requests per
+    worker for one route; the rest get 429 right away instead of queueing.
+    """
+
+    def __init__(self, name, default=0):
+        self.name = name
+        self.default = default
+        self._slots = None
+        self._lock = threading.Lock()
+
+    def _semaphore(self):
+        if self._slots is None:
+            with self._lock:
+                if self._slots is None:
+                    n = int(current_app.config.get(f"RATELIMIT_{self.name.upper()}_INFLIGHT", self.default) or 0)
+                    self._slots = threading.BoundedSemaphore(n) if n else False
+        return self._slots
+
+    def __call__(self, view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            slots = self._semaphore() if current_app.config.get("RATELIMIT_ENABLED", True) else None
+            if not slots:
+                return view(*args, **kwargs)
+            if not slots.acquire(blocking=False):
+                rejections.inc(self.name, "inflight")
+                raise RateLimited(1)
+            try:
+                return view(*args, **kwargs)
+            finally:
+                slots.release()
+        return wrapper
+
+
+def rate_limited(e):
+    resp = jsonify({"msg": "too many requests, try again shortly"})
+    resp.headers["Retry-After"] = str(e.retry_after)
+    return resp, 429
@@ -0,0 +1,295 @@
+import datetime
+import heapq
+import math
+import os
+import pickle
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+from utils import tasks
+
+# In-process BM25 search over posts (title, tags, body), replacing the Mongo
+# $text / $regex search. Built once from the posts collection (or loaded from
+# a snapshot), then kept current by the write endpoints and a periodic
+# catch-up query for writes made by other workers.
+#
+# Only build() and sync() move the watermark, from what they read back from
+# Mongo: this worker's own writes say nothing about what other workers wrote
+# before them. sync() re-reads SYNC_OVERLAP before the watermark to catch
+# writes that committed out of timestamp order, and a periodic full rebuild
+# (which also drops posts deleted by other workers) is the only thing that
+# writes the shared snapshot.
+
+FIELD_BOOSTS = {"title": 3.0, "tags": 2.0, "body": 1.0}
+K1 = 1.2
+B = 0.75
+SNAPSHOT_VERSION = 2
+SYNC_OVERLAP = datetime.timedelta(seconds=60)
+PROJECTION = {"title": 1, "body": 1, "tags": 1, "created_at": 1, "updated_at": 1}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in is it its of on or that the this to was were will with".split()
+)
+
+
+def stem(word):
+    """Light suffix stripping; enough to match plurals and common verb forms."""
+    if len(word) <= 3:
+        return word
+    for suffix, repl in (("sses", "ss"), ("ies", "y"), ("ing", ""), ("edly", ""), ("ed", ""), ("ly", ""), ("es", ""), ("s", "")):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            if suffix == "s" and word.endswith("ss"):
+                return word
+            base = word[: -len(suffix)] + repl
+            # running -> runn -> run
+            if suffix in ("ing", "ed") and len(base) > 3 and base[-1] == base[-2] and base[-1] not in "lsz":
+                base = base[:-1]
+            return base
+    return word
+
+
+def tokenize(text):
+    return [stem(t) for t in _TOKEN_RE.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+def _fields(doc):
+    tags = doc.get("tags") or []
+    if isinstance(tags, str):
+        tags = [tags]
+    return {
+        "title": tokenize(doc.get("title")),
+        "tags": tokenize(" ".join(tags)),
+        "body": tokenize(doc.get("body")),
+    }
+
+
+def _doc_version(doc):
+    return max(filter(None, [doc.get("created_at"), doc.get("updated_at")]), default=None)
+
+
+class SearchIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+        self.ready = False
+        self.last_sync = 0.0    # monotonic
+        self.built_at = 0.0     # wall clock, survives snapshots
+
+    def _reset(self):
+        self.postings = defaultdict(dict)   # term -> {doc_id: {field: tf}}
+        self.doc_terms = {}                 # doc_id -> set of terms (for removal)
+        self.field_lengths = {}             # doc_id -> {field: token count}
+        self.total_lengths = Counter()      # field -> sum of token counts
+        self.created = {}                   # doc_id -> created_at, tie-breaker
+        self.watermark = None               # newest created_at/updated_at read from Mongo
+
+    ## maintenance
+
+    def add(self, doc):
+        """Index (or re-index) one post document."""
+        doc_id = str(doc.get("_id") or doc.get("id"))
+        fields = _fields(doc)
+        with self._lock:
+            self._remove(doc_id)
+            terms = set()
+            lengths = {}
+            for field, tokens in fields.items():
+                lengths[field] = len(tokens)
+                self.total_lengths[field] += len(tokens)
+                for term, tf in Counter(tokens).items():
+                    self.postings[term].setdefault(doc_id, {})[field] = tf
+                    terms.add(term)
+            self.doc_terms[doc_id] = terms
+            self.field_lengths[doc_id] = lengths
+            self.created[doc_id] = doc.get("created_at")
+
+    def _advance(self, docs):
+        """Move the watermark up to the newest version among docs read from Mongo."""
+        versions = [v for v in map(_doc_version, docs) if v]
+        if versions and (self.watermark is None or max(versions) > self.watermark):
+            self.watermark = max(versions)
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._remove(str(doc_id))
+
+    def _remove(self, doc_id):
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[term]
+        for field, n in self.field_lengths.pop(doc_id, {}).items():
+            self.total_lengths[field] -= n
+        self.created.pop(doc_id, None)
+
+    ## query
+
+    def search(self, query, limit=10):
+        """Return [(doc_id, score)] best first, BM25 with per-field boosts."""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self._lock:
+            n_docs = len(self.doc_terms)
+            if not n_docs:
+                return []
+            avg = {f: (self.total_lengths[f] / n_docs) or 1.0 for f in FIELD_BOOSTS}
+            scores = defaultdict(float)
+            for term in terms:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tfs in postings.items():
+                    lengths = self.field_lengths[doc_id]
+                    weighted = 0.0
+                    for field, tf in tfs.items():
+                        norm = 1 - B + B * lengths[field] / avg[field]
+                        weighted += FIELD_BOOSTS[field] * tf / norm
+                    scores[doc_id] += idf * weighted / (K1 + weighted)
+            epoch = datetime.datetime.min
+            return heapq.nlargest(
+                limit, scores.items(), key=lambda kv: (kv[1], self.created.get(kv[0]) or epoch)
+            )
+
+    ## build / sync / snapshot
+
+    def build(self, db):
+        """Index every post into a fresh index, then swap it in; searches use the old one meanwhile."""
+        started = datetime.datetime.utcnow()
+        fresh = SearchIndex()
+        docs = db.posts.find({}, PROJECTION)
+        for doc in docs:
+            fresh.add(doc)
+            fresh._advance([doc])
+        # a post written while we scanned may have been missed: the next sync starts from here
+        if fresh.watermark is None or fresh.watermark > started:
+            fresh.watermark = started
+        with self._lock:
+            self.postings = fresh.postings
+            self.doc_terms = fresh.doc_terms
+            self.field_lengths = fresh.field_lengths
+            self.total_lengths = fresh.total_lengths
+            self.created = fresh.created
+            self.watermark = fresh.watermark
+            self.ready = True
+            self.last_sync = time.monotonic()
+            self.built_at = time.time()
+
+    def sync(self, db):
+        """Pick up posts created or edited (by any worker) since the watermark, less SYNC_OVERLAP."""
+        with self._lock:
+            self.last_sync = time.monotonic()
+            wm = self.watermark
+        filt = {}
+        if wm is not None:
+            since = wm - SYNC_OVERLAP
+            filt = {"$or": [{"created_at": {"$gt": since}}, {"updated_at": {"$gt": since}}]}
+        changed = list(db.posts.find(filt, PROJECTION))
+        with self._lock:
+            for doc in changed:
+                self.add(doc)
+            self._advance(changed)
+        return len(changed)
+
+    def save(self, path):
+        with self._lock:
+            state = {
+                "version": SNAPSHOT_VERSION,
+                "postings": dict(self.postings),
+                "doc_terms": self.doc_terms,
+                "field_lengths": self.field_lengths,
+                "total_lengths": self.total_lengths,
+                "created": self.created,
+                "watermark": self.watermark,
+                "built_at": self.built_at,
+            }
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    def load(self, path):
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        if state.get("version") != SNAPSHOT_VERSION:
+            raise ValueError("search snapshot version mismatch")
+        with self._lock:
+            self._reset()
+            self.postings.update(state["postings"])
+            self.doc_terms = state["doc_terms"]
+            self.field_lengths = state["field_lengths"]
+            self.total_lengths = state["total_lengths"]
+            self.created = state["created"]
+            self.watermark = state["watermark"]
+            self.built_at = state["built_at"]
+            self.ready = True
+
+
+search_index = SearchIndex()
+_init_lock = threading.Lock()
+_rebuilding = threading.Event()
+
+
+def rebuild(app, db):
+    """Full rebuild plus snapshot; run by the periodic job and `flask build-search-index`."""
+    try:
+        search_index.build(db)
+        path = app.config.get("SEARCH_INDEX_PATH")
+        if path:
+            try:
+                search_index.save(path)
+            except Exception:
+                app.logger.exception("could not write search snapshot %s", path)
+    finally:
+        _rebuilding.clear()
+
+
+def ensure_search_index(app, db):
+    """
+    Make the index usable: load the snapshot (falling back to a full build) on
+    first call, then run a catch-up sync at most every SEARCH_SYNC_INTERVAL s
+    and hand a full rebuild to the background pool every
+    SEARCH_REBUILD_INTERVAL s.
+    """
+    path = app.config.get("SEARCH_INDEX_PATH")
+    if not search_index.ready:
+        with _init_lock:
+            if not search_index.ready:
+                if path and os.path.exists(path):
+                    try:
+                        search_index.load(path)
+                        search_index.sync(db)
+                    except Exception:
+                        app.logger.exception("could not load search snapshot %s, rebuilding", path)
+                        search_index.ready = False
+                if not search_index.ready:
+                    _rebuilding.set()
+                    rebuild(app, db)
+        return search_index
+
+    if time.monotonic() - search_index.last_sync > app.config.get("SEARCH_SYNC_INTERVAL", 30):
+        search_index.sync(db)
+    if time.time() - search_index.built_at > app.config.get("SEARCH_REBUILD_INTERVAL", 3600) and not _rebuilding.is_set():
+        _rebuilding.set()
+        tasks.submit(rebuild, app, db)
+    return search_index
+
+
+def index_post(doc):
+    """Hook for write paths; a not-yet-built index picks the post up when it builds."""
+    if search_index.ready:
+        search_index.add(doc)
+
+
+def unindex_post(post_id):
+    if search_index.ready:
+        search_index.remove(post_id)
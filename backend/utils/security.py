@@ -0,0 +1,80 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from utils.ratelimit import RateLimited
+
+# Password hashing is CPU heavy by design and holds the GIL, so it runs on a
+# small process pool. A semaphore bounds how many requests may wait on it;
+# beyond that we shed load with HashingBusy (a RateLimited, so the app-wide
+# 429 handler answers it) instead of queueing.
+
+DEFAULT_METHOD = "scrypt"
+
+
+class HashingBusy(RateLimited):
+    pass
+
+
+_pool = None
+_slots = None
+_lock = threading.Lock()
+_normalized_methods = {}
+
+
+def _setup(app):
+    global _pool, _slots
+    if _slots is None:
+        with _lock:
+            if _slots is None:
+                workers = app.config.get("PASSWORD_HASH_WORKERS", 1)
+                if workers > 0:
+                    # spawn, not fork: forking a threaded gunicorn worker can deadlock
+                    _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+                _slots = threading.BoundedSemaphore(
+                    app.config.get("PASSWORD_HASH_MAX_INFLIGHT", max(workers, 1) * 4)
+                )
+    return _pool, _slots
+
+
+def _run(fn, *args):
+    app = current_app
+    pool, slots = _setup(app)
+    wait = app.config.get("PASSWORD_HASH_QUEUE_TIMEOUT", 2.0)
+    if not slots.acquire(timeout=wait):
+        raise HashingBusy(retry_after=max(1, int(wait)))
+    try:
+        if pool is None:
+            return fn(*args)
+        return pool.submit(fn, *args).result()
+    finally:
+        slots.release()
+
+
+def _method():
+    return current_app.config.get("PASSWORD_HASH_METHOD", DEFAULT_METHOD)
+
+
+def _salt_length():
+    return current_app.config.get("PASSWORD_HASH_SALT_LENGTH", 16)
+
+
+def hash_password(password: str) -> str:
+    return _run(generate_password_hash, password, _method(), _salt_length())
+
+
+def verify_password(stored_hash: str, password: str) -> bool:
+    if not stored_hash:
+        return False
+    return _run(check_password_hash, stored_hash, password)
+
+
+def needs_rehash(stored_hash: str) -> bool:
+    """True if stored_hash was made with a different method/cost than configured now."""
+    method = _method()
+    if method not in _normalized_methods:
+        # werkzeug expands defaults ("scrypt" -> "scrypt:32768:8:1"); hash once to learn the full form
+        _normalized_methods[method] = generate_password_hash("", method, 1).split("$", 1)[0]
+    return (stored_hash or "").split("$", 1)[0] != _normalized_methods[method]
@@ -0,0 +1,109 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from extensions import mongo
+from utils import tasks
+
+# Startup accounting, and startup work that has to wait for the worker process.
+#
+# create_app() must not talk to the network: under `gunicorn --preload` it runs
+# once in the master, and a MongoClient used before fork hands its sockets and
+# monitor threads to every worker. The client is created with connect=False;
+# anything that needs the database at startup (index bootstrap, warming the
+# search / trending / suggest indexes) is registered with defer() and runs
+# once per process, in the background pool, when that process sees its first
+# request.
+
+
+class StartupTimer:
+    """Wall time of each create_app() phase, kept on app.extensions["startup"]."""
+
+    def __init__(self):
+        self.phases = []        # (name, seconds), in order
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - started))
+
+    def total(self):
+        return sum(seconds for _, seconds in self.phases)
+
+    def summary(self):
+        parts = ", ".join(f"{name} {seconds * 1000:.1f}ms" for name, seconds in self.phases)
+        return f"{self.total() * 1000:.1f}ms ({parts})"
+
+
+## DEFERRED STARTUP WORK
+
+def defer(app, fn):
+    """Run fn(app, db) in the background once per process, on its first request."""
+    app.extensions.setdefault("deferred_startup", []).append(fn)
+
+
+def init_deferred(app):
+    state = {"pid": None}
+    lock = threading.Lock()
+
+    @app.before_request
+    def run_deferred_startup():
+        # keyed on pid: a forked worker starts with its parent's state
+        if state["pid"] == os.getpid():
+            return
+        with lock:
+            if state["pid"] == os.getpid():
+                return
+            state["pid"] = os.getpid()
+        for fn in app.extensions.get("deferred_startup", []):
+            tasks.submit(fn, app, mongo.db)
+
+
+## REPORT
+
+_REPORT_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter() - started
+timer = app.app.extensions["startup"]
+sys.stdout.write(json.dumps({"import_app": imported, "phases": timer.phases}))
+"""
+
+
+def _parse_importtime(stderr):
+    """`-X importtime` lines -> {top-level module: self seconds}."""
+    totals = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue            # the header line
+        module = fields[2].strip().split(".")[0]
+        totals[module] += int(fields[0]) / 1e6
+    return dict(totals)
+
+
+def startup_report(root_path):
+    """
+    Import app.py in a fresh interpreter with -X importtime, as a worker
+    would on a cold start. Returns (seconds per top-level module imported,
+    create_app phases, total seconds for `import app`).
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _REPORT_SCRIPT],
+        cwd=root_path, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import app failed")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    return _parse_importtime(proc.stderr), result["phases"], result["import_app"]
@@ -0,0 +1,229 @@
+import datetime
+import heapq
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+
+from utils import tasks
+from utils.search import SYNC_OVERLAP
+
+# Typeahead over post titles and tags. Keys live in one sorted list so a
+# prefix is a bisect range; candidates in the range are ranked by popularity.
+# Title keys are indexed from every word start, so "pyth" finds
+# "Learning Python". The watermark follows the same rules as utils/search.py:
+# only build() and sync() move it, from what they read back from Mongo.
+
+MAX_SCAN = 5000
+_SPACE_RE = re.compile(r"\s+")
+_HIGH = "\U0010ffff"
+
+
+def normalize(text):
+    return _SPACE_RE.sub(" ", (text or "").lower()).strip()
+
+
+def popularity(likes_count, comments_count):
+    return (likes_count or 0) + 2 * (comments_count or 0) + 1
+
+
+def _title_keys(title):
+    words = normalize(title).split(" ")
+    return {" ".join(words[i:]) for i in range(len(words)) if words[i]}
+
+
+class SuggestIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+        self.ready = False
+        self.last_sync = 0.0
+        self.last_refresh = 0.0
+
+    def _reset(self):
+        self.keys = []      # sorted (key, kind, ident); kind is "title" or "tag"
+        self.posts = {}     # post_id -> {"title", "tags", "keys", "likes", "comments", "pop"}
+        self.tags = {}      # normalized tag -> {"text", "posts": set, "pop"}
+        self.watermark = None
+
+    def _insert_key(self, entry):
+        i = bisect_left(self.keys, entry)
+        if i == len(self.keys) or self.keys[i] != entry:
+            self.keys.insert(i, entry)
+
+    def _delete_key(self, entry):
+        i = bisect_left(self.keys, entry)
+        if i < len(self.keys) and self.keys[i] == entry:
+            del self.keys[i]
+
+    ## maintenance
+
+    def add(self, doc):
+        post_id = str(doc.get("_id") or doc.get("id"))
+        with self._lock:
+            self._remove(post_id)
+            title = doc.get("title") or ""
+            tags = [t for t in (doc.get("tags") or []) if isinstance(t, str) and t.strip()]
+            likes, comments = doc.get("likes_count") or 0, doc.get("comments_count") or 0
+            pop = popularity(likes, comments)
+            keys = [(k, "title", post_id) for k in _title_keys(title)]
+            for entry in keys:
+                insort(self.keys, entry)
+            for tag in tags:
+                norm = normalize(tag)
+                info = self.tags.get(norm)
+                if info is None:
+                    info = self.tags[norm] = {"text": tag.strip(), "posts": set(), "pop": 0}
+                    self._insert_key((norm, "tag", norm))
+                info["posts"].add(post_id)
+                info["pop"] += pop
+            self.posts[post_id] = {
+                "title": title, "tags": [normalize(t) for t in tags], "keys": keys,
+                "likes": likes, "comments": comments, "pop": pop,
+            }
+
+    def _advance(self, docs):
+        versions = [max(filter(None, [d.get("created_at"), d.get("updated_at")]), default=None) for d in docs]
+        versions = [v for v in versions if v]
+        if versions and (self.watermark is None or max(versions) > self.watermark):
+            self.watermark = max(versions)
+
+    def remove(self, post_id):
+        with self._lock:
+            self._remove(str(post_id))
+
+    def _remove(self, post_id):
+        info = self.posts.pop(post_id, None)
+        if info is None:
+            return
+        for entry in info["keys"]:
+            self._delete_key(entry)
+        for norm in info["tags"]:
+            tag = self.tags.get(norm)
+            if tag is None:
+                continue
+            tag["posts"].discard(post_id)
+            tag["pop"] -= info["pop"]
+            if not tag["posts"]:
+                del self.tags[norm]
+                self._delete_key((norm, "tag", norm))
+
+    def set_counts(self, post_id, likes_count=None, comments_count=None):
+        """Cheap update from toggle_like / comments: counters changed, keys did not."""
+        with self._lock:
+            info = self.posts.get(str(post_id))
+            if info is None:
+                return
+            if likes_count is not None:
+                info["likes"] = likes_count
+            if comments_count is not None:
+                info["comments"] = comments_count
+            pop = popularity(info["likes"], info["comments"])
+            delta = pop - info["pop"]
+            info["pop"] = pop
+            for norm in info["tags"]:
+                if norm in self.tags:
+                    self.tags[norm]["pop"] += delta
+
+    ## query
+
+    def suggest(self, prefix, limit=8):
+        p = normalize(prefix)
+        if not p:
+            return []
+        with self._lock:
+            lo = bisect_left(self.keys, (p,))
+            hi = bisect_left(self.keys, (p + _HIGH,), lo, min(len(self.keys), lo + MAX_SCAN))
+            seen = set()
+            candidates = []
+            for _, kind, ident in self.keys[lo:hi]:
+                if (kind, ident) in seen:
+                    continue
+                seen.add((kind, ident))
+                if kind == "title":
+                    info = self.posts[ident]
+                    candidates.append((info["pop"], kind, ident, info["title"]))
+                else:
+                    info = self.tags[ident]
+                    candidates.append((info["pop"], kind, ident, info["text"]))
+        top = heapq.nlargest(limit, candidates, key=lambda c: c[0])
+        return [
+            {"text": text, "type": kind, "post_id": ident if kind == "title" else None, "score": pop}
+            for pop, kind, ident, text in top
+        ]
+
+    ## build / sync
+
+    PROJECTION = {"title": 1, "tags": 1, "likes_count": 1, "comments_count": 1, "created_at": 1, "updated_at": 1}
+
+    def build(self, db):
+        # build aside and swap in, so queries aren't blocked during a rebuild
+        started = datetime.datetime.utcnow()
+        fresh = SuggestIndex()
+        for doc in db.posts.find({}, self.PROJECTION):
+            fresh.add(doc)
+            fresh._advance([doc])
+        # a post written while we scanned may have been missed: the next sync starts from here
+        if fresh.watermark is None or fresh.watermark > started:
+            fresh.watermark = started
+        with self._lock:
+            self.keys, self.posts, self.tags = fresh.keys, fresh.posts, fresh.tags
+            self.watermark = fresh.watermark
+            self.ready = True
+            self.last_sync = self.last_refresh = time.monotonic()
+
+    def sync(self, db):
+        """Pick up posts created or edited (by any worker) since the watermark, less SYNC_OVERLAP."""
+        with self._lock:
+            self.last_sync = time.monotonic()
+            wm = self.watermark
+        filt = {}
+        if wm is not None:
+            since = wm - SYNC_OVERLAP
+            filt = {"$or": [{"created_at": {"$gt": since}}, {"updated_at": {"$gt": since}}]}
+        changed = list(db.posts.find(filt, self.PROJECTION))
+        with self._lock:
+            for doc in changed:
+                self.add(doc)
+            self._advance(changed)
+
+
+suggest_index = SuggestIndex()
+_init_lock = threading.Lock()
+
+
+def ensure_suggest_index(app, db):
+    """
+    Build on first use; afterwards run a cheap catch-up sync every
+    SUGGEST_SYNC_INTERVAL s and a full background rebuild (to pick up other
+    workers' likes and deletes) every SUGGEST_REFRESH_INTERVAL s.
+    """
+    if not suggest_index.ready:
+        with _init_lock:
+            if not suggest_index.ready:
+                suggest_index.build(db)
+        return suggest_index
+
+    now = time.monotonic()
+    if now - suggest_index.last_refresh > app.config.get("SUGGEST_REFRESH_INTERVAL", 600):
+        suggest_index.last_refresh = now
+        tasks.submit(suggest_index.build, db)
+    elif now - suggest_index.last_sync > app.config.get("SUGGEST_SYNC_INTERVAL", 30):
+        suggest_index.sync(db)
+    return suggest_index
+
+
+def add_suggestions(doc):
+    """Hook for write paths; a not-yet-built index picks the post up when it builds."""
+    if suggest_index.ready:
+        suggest_index.add(doc)
+
+
+def remove_suggestions(post_id):
+    if suggest_index.ready:
+        suggest_index.remove(post_id)
+
+
+def update_suggestion_counts(post_id, likes_count=None, comments_count=None):
+    if suggest_index.ready:
+        suggest_index.set_counts(post_id, likes_count, comments_count)
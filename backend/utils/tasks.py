@@ -0,0 +1,54 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+_executor = None
+_lock = threading.Lock()
+
+
+def _get_executor(app):
+    # Created on first use so a preloading master never owns worker threads.
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=app.config.get("BACKGROUND_WORKERS", 4),
+                    thread_name_prefix="background",
+                )
+    return _executor
+
+
+def _run(app, fn, args, kwargs, retries, backoff, on_failure):
+    with app.app_context():
+        attempt = 0
+        while True:
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if attempt >= retries:
+                    app.logger.exception("background task %s failed after %d attempts", fn.__name__, attempt + 1)
+                    if on_failure is not None:
+                        try:
+                            on_failure(e)
+                        except Exception:
+                            app.logger.exception("on_failure for %s failed", fn.__name__)
+                    return None
+                delay = backoff * (2 ** attempt) * (1 + random.random() / 2)
+                app.logger.warning("background task %s failed (%s), retrying in %.1fs", fn.__name__, e, delay)
+                time.sleep(delay)
+                attempt += 1
+
+
+def submit(fn, *args, retries=0, backoff=1.0, on_failure=None, **kwargs):
+    """
+    Run fn(*args, **kwargs) on the bounded background pool inside an app context,
+    retrying with exponential backoff. on_failure(exc) runs once retries are exhausted.
+    With BACKGROUND_TASKS_EAGER set (tests, benchmarks) the task runs inline.
+    """
+    app = current_app._get_current_object()
+    if app.config.get("BACKGROUND_TASKS_EAGER"):
+        return _run(app, fn, args, kwargs, retries, 0, on_failure)
+    return _get_executor(app).submit(_run, app, fn, args, kwargs, retries, backoff, on_failure)
@@ -0,0 +1,42 @@
+import math
+import re
+
+EXCERPT_LENGTH = 180
+WORDS_PER_MINUTE = 200
+
+_WORD_RE = re.compile(r"\S+")
+
+
+def make_excerpt(body, length=EXCERPT_LENGTH):
+    """First `length` chars of body, without cutting a word in half."""
+    body = (body or "").strip()
+    if len(body) <= length:
+        return body
+    return body[:length].rsplit(" ", 1)[0]
+
+
+def reading_time(body, wpm=WORDS_PER_MINUTE):
+    """Estimated reading time in whole minutes (at least 1)."""
+    words = len(_WORD_RE.findall(body or ""))
+    return max(1, math.ceil(words / wpm))
+
+
+def derived_fields(body):
+    """Fields stored on a post whenever its body is written."""
+    return {"excerpt": make_excerpt(body), "reading_time": reading_time(body)}
+
+
+def fill_missing_excerpts(docs, db):
+    """
+    Posts written before excerpts were stored have none until `flask
+    backfill-excerpts` runs; fetch just those bodies, in one query, and
+    derive it. A no-op once the backfill is done.
+    """
+    missing = [d["_id"] for d in docs if d.get("excerpt") is None and d.get("_id") is not None]
+    if not missing:
+        return docs
+    bodies = {p["_id"]: p.get("body") for p in db.posts.find({"_id": {"$in": missing}}, {"body": 1})}
+    for d in docs:
+        if d.get("excerpt") is None and d.get("_id") in bodies:
+            d["excerpt"] = make_excerpt(bodies[d["_id"]])
+    return docs
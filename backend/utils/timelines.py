@@ -0,0 +1,237 @@
+import datetime
+import threading
+import time
+from bson.objectid import ObjectId
+from flask import current_app
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from extensions import mongo
+from utils.pagination import keyset_filter
+
+# Home timelines, materialized on write. Every user has one document in
+# `timelines` holding the newest TIMELINE_LENGTH entries ({post_id,
+# author_id, created_at}, newest first) of the people they follow, so
+# reading a feed is a single _id lookup.
+#
+# Authors with more than FANOUT_MAX_FOLLOWERS followers are flagged
+# fanout_on_read: their posts are not pushed to followers (one post would
+# mean millions of writes) but merged in when a follower reads the feed.
+
+DEFAULT_TIMELINE_LENGTH = 800
+DEFAULT_FANOUT_MAX_FOLLOWERS = 10000
+FANOUT_BATCH = 1000
+BACKFILL_POSTS = 20
+CELEBRITY_REFRESH = 60
+
+
+class UserNotFound(Exception):
+    pass
+
+
+def _config(key, default):
+    return current_app.config.get(key, default)
+
+
+def _now():
+    return datetime.datetime.utcnow()
+
+
+def entry(post):
+    return {"post_id": post["_id"], "author_id": post["author_id"], "created_at": post["created_at"]}
+
+
+def _push(entries):
+    return {"$push": {"entries": {
+        "$each": entries,
+        "$sort": {"created_at": -1, "post_id": -1},
+        "$slice": _config("TIMELINE_LENGTH", DEFAULT_TIMELINE_LENGTH),
+    }}, "$set": {"updated_at": _now()}}
+
+
+## FOLLOW GRAPH
+
+def _user_oid(user_id):
+    try:
+        return ObjectId(str(user_id))
+    except Exception:
+        raise UserNotFound()
+
+
+def _bump_followers(followee_id, delta):
+    return mongo.db.users.find_one_and_update(
+        {"_id": _user_oid(followee_id)},
+        {"$inc": {"followers_count": delta}},
+        projection={"followers_count": 1, "fanout_on_read": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def follow(follower_id, followee_id):
+    """
+    Returns (created, followers_count). Raises UserNotFound.
+    The insert is the duplicate check, counters move only when it succeeds.
+    """
+    if not mongo.db.users.find_one({"_id": _user_oid(followee_id)}, {"_id": 1}):
+        raise UserNotFound()
+    try:
+        mongo.db.follows.insert_one({"follower_id": follower_id, "followee_id": followee_id, "created_at": _now()})
+    except DuplicateKeyError:
+        user = mongo.db.users.find_one({"_id": _user_oid(followee_id)}, {"followers_count": 1})
+        return False, (user or {}).get("followers_count", 0)
+
+    followee = _bump_followers(followee_id, 1)
+    mongo.db.users.update_one({"_id": _user_oid(follower_id)}, {"$inc": {"following_count": 1}})
+    if followee is None:
+        # deleted between the check and the insert
+        mongo.db.follows.delete_one({"follower_id": follower_id, "followee_id": followee_id})
+        raise UserNotFound()
+
+    count = followee.get("followers_count", 0)
+    if count > _config("FANOUT_MAX_FOLLOWERS", DEFAULT_FANOUT_MAX_FOLLOWERS) and not followee.get("fanout_on_read"):
+        # one-way switch: once an author is read-merged we don't go back to pushing
+        mongo.db.users.update_one({"_id": followee["_id"]}, {"$set": {"fanout_on_read": True}})
+    elif not followee.get("fanout_on_read"):
+        backfill(follower_id, followee_id)
+    return True, count
+
+
+def unfollow(follower_id, followee_id):
+    """Returns (removed, followers_count)."""
+    res = mongo.db.follows.delete_one({"follower_id": follower_id, "followee_id": followee_id})
+    if not res.deleted_count:
+        user = mongo.db.users.find_one({"_id": _user_oid(followee_id)}, {"followers_count": 1})
+        return False, (user or {}).get("followers_count", 0)
+
+    followee = _bump_followers(followee_id, -1)
+    mongo.db.users.update_one({"_id": _user_oid(follower_id)}, {"$inc": {"following_count": -1}})
+    # one document, so dropping their entries right away is cheap
+    mongo.db.timelines.update_one({"_id": follower_id}, {"$pull": {"entries": {"author_id": followee_id}}})
+    return True, (followee or {}).get("followers_count", 0)
+
+
+def backfill(follower_id, followee_id, limit=BACKFILL_POSTS):
+    """Seed a new follower's timeline with the followee's most recent posts."""
+    posts = list(
+        mongo.db.posts.find({"author_id": followee_id}, {"author_id": 1, "created_at": 1})
+        .sort([("created_at", -1), ("_id", -1)])
+        .limit(limit)
+    )
+    if posts:
+        mongo.db.timelines.update_one({"_id": follower_id}, _push([entry(p) for p in posts]), upsert=True)
+
+
+## FAN-OUT ON WRITE
+
+def _bulk_push(ops):
+    try:
+        mongo.db.timelines.bulk_write(ops, ordered=False)
+    except BulkWriteError as e:
+        # duplicate _id: that timeline already holds the entries (see fan_out)
+        if e.details.get("writeConcernErrors") or any(
+            err.get("code") != 11000 for err in e.details.get("writeErrors", [])
+        ):
+            raise
+
+
+def _followers(author_id):
+    """The author's follower ids, in batches of FANOUT_BATCH."""
+    batch = []
+    for f in mongo.db.follows.find({"followee_id": author_id}, {"follower_id": 1, "_id": 0}):
+        batch.append(f["follower_id"])
+        if len(batch) >= FANOUT_BATCH:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def fan_out(author_id, entries):
+    """
+    Push entries (see entry()) to the author's own timeline and, unless the
+    author is fanout_on_read, to every follower's. Runs as a background task.
+
+    Safe to retry after a partial failure: a timeline that already holds
+    these posts doesn't match the filter, and its upsert fails on the _id
+    instead of pushing them twice.
+    """
+    update = _push(entries)
+    absent = {"entries.post_id": {"$nin": [e["post_id"] for e in entries]}}
+    try:
+        mongo.db.timelines.update_one({"_id": author_id, **absent}, update, upsert=True)
+    except DuplicateKeyError:
+        pass
+
+    author = mongo.db.users.find_one({"_id": _user_oid(author_id)}, {"fanout_on_read": 1})
+    if not author or author.get("fanout_on_read"):
+        return 0
+
+    pushed = 0
+    for batch in _followers(author_id):
+        _bulk_push([UpdateOne({"_id": follower_id, **absent}, update, upsert=True) for follower_id in batch])
+        pushed += len(batch)
+    return pushed
+
+
+def retract(author_id, post_id):
+    """
+    Pull a deleted post from its author's and followers' timelines, so feed
+    pages don't come back short. Runs as a background task. Followers of a
+    fanout_on_read author are included: the post may predate the switch.
+    """
+    pull = {"$pull": {"entries": {"post_id": post_id}}}
+    mongo.db.timelines.update_one({"_id": author_id}, pull)
+    for batch in _followers(author_id):
+        mongo.db.timelines.update_many({"_id": {"$in": batch}, "entries.post_id": post_id}, pull)
+
+
+## FAN-OUT ON READ
+
+_celebrities = set()
+_celebrities_at = 0.0
+_celebrities_lock = threading.Lock()
+
+
+def celebrity_ids():
+    """Ids of fanout_on_read authors; a short list, refreshed every minute."""
+    global _celebrities, _celebrities_at
+    if time.monotonic() - _celebrities_at > CELEBRITY_REFRESH:
+        with _celebrities_lock:
+            if time.monotonic() - _celebrities_at > CELEBRITY_REFRESH:
+                _celebrities = {str(u["_id"]) for u in mongo.db.users.find({"fanout_on_read": True}, {"_id": 1})}
+                _celebrities_at = time.monotonic()
+    return _celebrities
+
+
+def followed_celebrities(user_id):
+    celebs = celebrity_ids()
+    if not celebs:
+        return []
+    return [
+        f["followee_id"] for f in
+        mongo.db.follows.find({"follower_id": user_id, "followee_id": {"$in": list(celebs)}}, {"followee_id": 1})
+    ]
+
+
+def timeline_entries(user_id, after=None, limit=10):
+    """
+    Up to limit entries older than `after` ((created_at, post_id) or None),
+    newest first: the materialized timeline merged with recent posts of
+    followed fanout_on_read authors.
+    """
+    doc = mongo.db.timelines.find_one({"_id": user_id}, {"entries": 1}) or {}
+    entries = doc.get("entries") or []
+    if after is not None:
+        entries = [e for e in entries if (e["created_at"], e["post_id"]) < after]
+    merged = {e["post_id"]: e for e in entries[:limit]}
+
+    celebs = followed_celebrities(user_id)
+    if celebs:
+        query = {"author_id": {"$in": celebs}}
+        if after is not None:
+            query.update(keyset_filter(*after))
+        for p in (mongo.db.posts.find(query, {"author_id": 1, "created_at": 1})
+                  .sort([("created_at", -1), ("_id", -1)]).limit(limit)):
+            merged.setdefault(p["_id"], entry(p))
+
+    return sorted(merged.values(), key=lambda e: (e["created_at"], e["post_id"]), reverse=True)[:limit]
@@ -0,0 +1,229 @@
+import datetime
+import heapq
+import math
+import os
+import pickle
+import threading
+import time
+from bson.objectid import ObjectId
+
+from utils import tasks
+
+# "Hot" ranking kept in memory. A post's score is
+#     log10(likes + 2 * comments) + (created_at - EPOCH) / DECAY
+# (the Reddit formula), so newer posts need exponentially less engagement to
+# outrank older ones, and a score only changes when its counters do; no
+# re-scoring as time passes. Each worker holds the top POOL_SIZE posts with
+# everything a card needs, updated by the like/comment write paths and
+# rebuilt from Mongo in the background every TRENDING_REFRESH_INTERVAL s.
+# Serving the endpoint never queries Mongo.
+
+EPOCH = datetime.datetime(2024, 1, 1)
+DEFAULT_DECAY = 45000           # seconds for a 10x engagement difference
+DEFAULT_WINDOW_DAYS = 7         # posts older than this never trend
+POOL_SIZE = 500
+SNAPSHOT_VERSION = 1
+
+PROJECTION = {
+    "title": 1, "excerpt": 1, "reading_time": 1, "image": 1, "tags": 1, "author_id": 1,
+    "likes_count": 1, "comments_count": 1, "created_at": 1, "updated_at": 1,
+}
+
+
+def hot_score(likes_count, comments_count, created_at, decay=DEFAULT_DECAY):
+    engagement = (likes_count or 0) + 2 * (comments_count or 0)
+    return math.log10(max(engagement, 1)) + (created_at - EPOCH).total_seconds() / decay
+
+
+def _cards(docs):
+    """What the endpoint returns per post, authors included, built from post documents."""
+    from utils.authors import attach_authors
+    cards = []
+    for doc in docs:
+        card = {k: doc.get(k) for k in PROJECTION}
+        card["id"] = str(doc.get("_id") or doc.get("id"))
+        card["likes_count"] = card["likes_count"] or 0
+        card["comments_count"] = card["comments_count"] or 0
+        cards.append(card)
+    return attach_authors(cards)
+
+
+class TrendingIndex:
+    def __init__(self, decay=DEFAULT_DECAY, pool_size=POOL_SIZE):
+        self._lock = threading.Lock()
+        self.decay = decay
+        self.pool_size = pool_size
+        self.entries = {}       # post_id -> [score, card]
+        self.ready = False
+        self.built_at = 0.0     # wall clock, survives snapshots
+
+    def _threshold(self):
+        """Score a post must beat to enter a full pool."""
+        if len(self.entries) < self.pool_size:
+            return float("-inf")
+        return min(score for score, _ in self.entries.values())
+
+    def _trim(self):
+        if len(self.entries) > self.pool_size * 2:
+            keep = heapq.nlargest(self.pool_size, self.entries.items(), key=lambda kv: kv[1][0])
+            self.entries = dict(keep)
+
+    ## incremental updates
+
+    def add(self, card):
+        """Pool a card (see _cards) if it scores high enough, or refresh it if already pooled."""
+        if not card["created_at"]:
+            return
+        score = hot_score(card["likes_count"], card["comments_count"], card["created_at"], self.decay)
+        with self._lock:
+            if card["id"] in self.entries or score > self._threshold():
+                self.entries[card["id"]] = [score, card]
+                self._trim()
+
+    def set_counts(self, post_id, likes_count=None, comments_count=None):
+        """
+        Returns True if handled, False if the post isn't pooled but may now
+        qualify (the caller should fetch and add() it).
+        """
+        post_id = str(post_id)
+        with self._lock:
+            entry = self.entries.get(post_id)
+            if entry is not None:
+                card = entry[1]
+                if likes_count is not None:
+                    card["likes_count"] = likes_count
+                if comments_count is not None:
+                    card["comments_count"] = comments_count
+                entry[0] = hot_score(card["likes_count"], card["comments_count"], card["created_at"], self.decay)
+                return True
+            threshold = self._threshold()
+        # not pooled: its creation time is in the ObjectId; the unknown counter
+        # is taken as 0, which can only under-estimate
+        try:
+            created_at = ObjectId(post_id).generation_time.replace(tzinfo=None)
+        except Exception:
+            return True
+        return hot_score(likes_count, comments_count, created_at, self.decay) <= threshold
+
+    def remove(self, post_id):
+        with self._lock:
+            self.entries.pop(str(post_id), None)
+
+    ## query
+
+    def top(self, limit=10, tag=None):
+        with self._lock:
+            items = [(score, card) for score, card in self.entries.values()
+                     if tag is None or tag in (card.get("tags") or [])]
+        return [dict(card, score=round(score, 4))
+                for score, card in heapq.nlargest(limit, items, key=lambda sc: sc[0])]
+
+    ## build / snapshot
+
+    def build(self, db, window_days=DEFAULT_WINDOW_DAYS):
+        """Score every post in the window and swap in the best pool_size."""
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=window_days)
+        scored = []
+        for doc in db.posts.find({"created_at": {"$gte": cutoff}}, PROJECTION):
+            score = hot_score(doc.get("likes_count"), doc.get("comments_count"), doc["created_at"], self.decay)
+            scored.append((score, doc))
+        best = heapq.nlargest(self.pool_size, scored, key=lambda sd: sd[0])
+        cards = _cards(doc for _, doc in best)
+        with self._lock:
+            self.entries = {card["id"]: [score, card] for (score, _), card in zip(best, cards)}
+            self.ready = True
+            self.built_at = time.time()
+
+    def save(self, path):
+        with self._lock:
+            state = {"version": SNAPSHOT_VERSION, "decay": self.decay, "entries": self.entries, "built_at": self.built_at}
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    def load(self, path):
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        if state.get("version") != SNAPSHOT_VERSION or state.get("decay") != self.decay:
+            raise ValueError("trending snapshot is stale or from another configuration")
+        with self._lock:
+            self.entries = state["entries"]
+            self.built_at = state["built_at"]
+            self.ready = True
+
+
+trending_index = TrendingIndex()
+_init_lock = threading.Lock()
+_refreshing = threading.Event()
+
+
+def refresh(app, db):
+    """Full rebuild plus snapshot; run by the periodic job and `flask refresh-trending`."""
+    try:
+        trending_index.build(db, app.config.get("TRENDING_WINDOW_DAYS", DEFAULT_WINDOW_DAYS))
+        path = app.config.get("TRENDING_SNAPSHOT_PATH")
+        if path:
+            try:
+                trending_index.save(path)
+            except Exception:
+                app.logger.exception("could not write trending snapshot %s", path)
+    finally:
+        _refreshing.clear()
+
+
+def ensure_trending(app, db):
+    """
+    Load the snapshot (or build, once, on a cold start with none), then hand
+    full rebuilds to the background pool every TRENDING_REFRESH_INTERVAL s.
+    Once ready this never waits on Mongo.
+    """
+    trending_index.decay = app.config.get("TRENDING_DECAY_SECONDS", DEFAULT_DECAY)
+    if not trending_index.ready:
+        with _init_lock:
+            if not trending_index.ready:
+                path = app.config.get("TRENDING_SNAPSHOT_PATH")
+                if path and os.path.exists(path):
+                    try:
+                        trending_index.load(path)
+                    except Exception:
+                        app.logger.exception("could not load trending snapshot %s, rebuilding", path)
+                if not trending_index.ready:
+                    _refreshing.set()
+                    refresh(app, db)
+        return trending_index
+
+    if time.time() - trending_index.built_at > app.config.get("TRENDING_REFRESH_INTERVAL", 300) and not _refreshing.is_set():
+        _refreshing.set()
+        tasks.submit(refresh, app, db)
+    return trending_index
+
+
+def _fetch_and_add(post_id):
+    from extensions import mongo
+    doc = mongo.db.posts.find_one({"_id": ObjectId(post_id)}, PROJECTION)
+    if doc is not None:
+        trending_index.add(_cards([doc])[0])
+
+
+def update_trending_counts(post_id, likes_count=None, comments_count=None):
+    """Hook for toggle_like / comments. A post that may have just qualified is fetched in the background."""
+    if trending_index.ready and not trending_index.set_counts(post_id, likes_count, comments_count):
+        tasks.submit(_fetch_and_add, str(post_id))
+
+
+def add_trending(doc):
+    """Hook for new and edited posts: pools the post if it qualifies, refreshes its card if pooled."""
+    if trending_index.ready:
+        trending_index.add(_cards([doc])[0])
+
+
+def refresh_trending_card(post_id):
+    """Hook for out-of-band changes to a post (a finished image upload): re-read its card if pooled."""
+    if trending_index.ready and str(post_id) in trending_index.entries:
+        _fetch_and_add(str(post_id))
+
+
+def remove_trending(post_id):
+    if trending_index.ready:
+        trending_index.remove(post_id)
@@ -2,8 +2,9 @@
 
 import { useQuery } from "@tanstack/react-query";
 import api from "@/lib/api";
-import { Post } from "@/types";
+import { AuthorStats, Post } from "@/types";
 import { PostCard } from "@/components/PostCard";
+import { formatDate } from "@/lib/utils";
 import { useParams } from "next/navigation";
 
 export default function AuthorPage() {
@@ -18,6 +19,15 @@ export default function AuthorPage() {
     enabled: !!id,
   });
 
+  const { data: stats } = useQuery<AuthorStats>({
+    queryKey: ["authorStats", id],
+    queryFn: async () => {
+      const res = await api.get(`/users/${id}/stats`);
+      return res.data;
+    },
+    enabled: !!id,
+  });
+
   const posts: Post[] = data?.posts || [];
 
   return (
@@ -25,6 +35,14 @@ export default function AuthorPage() {
       <div className="mb-12 text-center">
         <h1 className="text-3xl font-bold tracking-tight mb-2">Author Profile</h1>
         <p className="text-muted-foreground">Posts by this author</p>
+        {stats && (
+          <div className="mt-6 flex flex-wrap justify-center gap-8 text-sm text-muted-foreground">
+            <span><strong className="text-foreground">{stats.posts_count}</strong> posts</span>
+            <span><strong className="text-foreground">{stats.likes_count}</strong> likes</span>
+            <span><strong className="text-foreground">{stats.comments_count}</strong> comments</span>
+            {stats.last_post_at && <span>Last post {formatDate(stats.last_post_at, "short")}</span>}
+          </div>
+        )}
       </div>
       
       {isLoading ? (
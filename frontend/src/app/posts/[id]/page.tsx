@@ -5,6 +5,7 @@ import { useParams, useRouter } from "next/navigation";
 import api from "@/lib/api";
 import { Post } from "@/types";
 import { formatDate } from "@/lib/utils";
+import { PostImage } from "@/components/PostImage";
 import { Button } from "@/components/ui/Button";
 import { FiArrowLeft, FiUser, FiCalendar } from "react-icons/fi";
 import Link from "next/link";
@@ -100,9 +101,11 @@ function PostDetailContent() {
 
         {post.image?.url && (
             <div className="relative w-full aspect-video rounded-xl overflow-hidden mb-12 shadow-sm">
-                <img 
-                   src={post.image.url} 
-                   alt={post.title} 
+                <PostImage
+                   image={post.image}
+                   alt={post.title}
+                   variant="full"
+                   sizes="(min-width: 896px) 896px, 100vw"
                    className="object-cover w-full h-full"
                 />
             </div>
@@ -126,7 +129,7 @@ function PostDetailContent() {
 
         {/* Comments Section */}
         <div className="mt-12 border-t pt-12">
-            <CommentsSection postId={post.id} />
+            <CommentsSection postId={post.id} commentsCount={post.comments_count} />
         </div>
 
     </article>
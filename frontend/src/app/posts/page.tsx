@@ -7,19 +7,27 @@ import { PostCard } from "@/components/PostCard";
 import { Button } from "@/components/ui/Button";
 import { useState } from "react";
 
+const PER_PAGE = 9;
+
 export default function PostsPage() {
-  const [page, setPage] = useState(1);
+  // cursors[i] is the cursor that fetches page i + 1; the first page has none
+  const [cursors, setCursors] = useState<(string | null)[]>([null]);
+  const page = cursors.length;
+  const cursor = cursors[page - 1];
   
   const { data, isLoading, isPlaceholderData } = useQuery({
-    queryKey: ["posts", page],
+    queryKey: ["posts", cursor],
     queryFn: async () => {
-      const res = await api.get(`/posts/?page=${page}&per_page=9`);
+      const params = new URLSearchParams({ per_page: String(PER_PAGE) });
+      if (cursor) params.set("cursor", cursor);
+      const res = await api.get(`/posts/?${params}`);
       return res.data;
     },
     placeholderData: (previousData) => previousData,
   });
 
   const posts: Post[] = data?.posts || [];
+  const nextCursor: string | null = data?.next_cursor ?? null;
 
   return (
     <div className="container mx-auto px-4 py-12">
@@ -42,7 +50,7 @@ export default function PostsPage() {
           <div className="flex justify-center gap-4">
             <Button 
               variant="outline" 
-              onClick={() => setPage(old => Math.max(old - 1, 1))}
+              onClick={() => setCursors(old => (old.length > 1 ? old.slice(0, -1) : old))}
               disabled={page === 1}
             >
               Previous
@@ -50,8 +58,8 @@ export default function PostsPage() {
             <span className="flex items-center text-sm font-medium">Page {page}</span>
              <Button 
               variant="outline" 
-              onClick={() => setPage(old => old + 1)}
-              disabled={posts.length < 9 || isPlaceholderData}
+              onClick={() => nextCursor && setCursors(old => [...old, nextCursor])}
+              disabled={!nextCursor || isPlaceholderData}
             >
               Next
             </Button>
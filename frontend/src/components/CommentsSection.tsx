@@ -1,7 +1,7 @@
 "use client";
 
 import { useState } from "react";
-import { useQuery, useMutation, useQueryClient } from "@tanstack/react-query";
+import { useInfiniteQuery, useMutation, useQueryClient } from "@tanstack/react-query";
 import api from "@/lib/api";
 import { useAuth } from "@/context/AuthContext";
 import { Button } from "@/components/ui/Button";
@@ -18,22 +18,32 @@ interface Comment {
   created_at: string;
 }
 
+interface CommentsPage {
+  comments: Comment[];
+  next_cursor: string | null;
+}
+
 interface CommentsSectionProps {
   postId: string;
+  commentsCount?: number;
 }
 
-export function CommentsSection({ postId }: CommentsSectionProps) {
+export function CommentsSection({ postId, commentsCount }: CommentsSectionProps) {
   const { user } = useAuth();
   const queryClient = useQueryClient();
   const [newComment, setNewComment] = useState("");
 
-  const { data: comments, isLoading } = useQuery({
+  const { data, isLoading, hasNextPage, fetchNextPage, isFetchingNextPage } = useInfiniteQuery({
     queryKey: ["comments", postId],
-    queryFn: async () => {
-      const res = await api.get(`/posts/${postId}/comments`);
-      return res.data as Comment[];
+    queryFn: async ({ pageParam }) => {
+      const params = pageParam ? `?cursor=${encodeURIComponent(pageParam)}` : "";
+      const res = await api.get(`/posts/${postId}/comments${params}`);
+      return res.data as CommentsPage;
     },
+    initialPageParam: null as string | null,
+    getNextPageParam: (lastPage) => lastPage.next_cursor,
   });
+  const comments = data?.pages.flatMap((page) => page.comments);
 
   const mutation = useMutation({
     mutationFn: async (body: string) => {
@@ -57,7 +67,7 @@ export function CommentsSection({ postId }: CommentsSectionProps) {
 
   return (
     <div className="mt-12 bg-secondary/30 p-8 rounded-lg">
-      <h3 className="text-xl font-bold mb-6 font-serif">Responses ({comments?.length || 0})</h3>
+      <h3 className="text-xl font-bold mb-6 font-serif">Responses ({commentsCount ?? comments?.length ?? 0})</h3>
       
       {user ? (
         <form onSubmit={handleSubmit} className="mb-8">
@@ -98,6 +108,13 @@ export function CommentsSection({ postId }: CommentsSectionProps) {
         ) : (
           <div className="text-center text-muted-foreground italic">No comments yet. Be the first to respond!</div>
         )}
+        {hasNextPage && (
+          <div className="flex justify-center">
+            <Button variant="outline" onClick={() => fetchNextPage()} isLoading={isFetchingNextPage}>
+              Load more responses
+            </Button>
+          </div>
+        )}
       </div>
     </div>
   );
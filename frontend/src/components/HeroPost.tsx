@@ -2,6 +2,7 @@ import Link from "next/link";
 import { Post } from "@/types";
 import { FiArrowRight } from "react-icons/fi";
 import { formatDate } from "@/lib/utils";
+import { PostImage } from "@/components/PostImage";
 
 interface HeroPostProps {
   post: Post;
@@ -9,17 +10,18 @@ interface HeroPostProps {
 
 export function HeroPost({ post }: HeroPostProps) {
   const authorName = post.author && typeof post.author === 'object' ? post.author.username : 'Unknown';
-  const imageUrl = post.image?.url;
+  const image = post.image?.url ? post.image : null;
 
   return (
     <section className="mb-20">
        <div className="grid grid-cols-1 md:grid-cols-2 gap-8 md:gap-12 items-center">
          {/* Image Side */}
          <Link href={`/posts/${post.id}`} className="block relative aspect-[4/3] md:aspect-square overflow-hidden rounded-2xl bg-muted group">
-            {imageUrl ? (
-              <img 
-                src={imageUrl} 
-                alt={post.title} 
+            {image ? (
+              <PostImage
+                image={image}
+                alt={post.title}
+                sizes="(min-width: 768px) 50vw, 100vw"
                 className="w-full h-full object-cover transition-transform duration-700 group-hover:scale-105"
               />
             ) : (
@@ -51,7 +53,7 @@ export function HeroPost({ post }: HeroPostProps) {
            </div>
 
            <div className="text-muted-foreground text-lg leading-relaxed line-clamp-3 font-serif max-w-md">
-             {post.body}
+             {post.excerpt ?? post.body}
            </div>
 
            <Link href={`/posts/${post.id}`} className="mt-4 inline-flex items-center gap-2 text-sm font-bold uppercase tracking-widest border-b border-foreground pb-1 hover:text-accent-color hover:border-accent-color transition-colors">
@@ -2,6 +2,7 @@ import Link from "next/link";
 import { Post } from "@/types";
 import { FiArrowUpRight, FiHeart } from "react-icons/fi";
 import { formatDate } from "@/lib/utils";
+import { PostImage } from "@/components/PostImage";
 
 interface PostCardProps {
   post: Post;
@@ -9,16 +10,17 @@ interface PostCardProps {
 
 export function PostCard({ post }: PostCardProps) {
   const authorName = post.author && typeof post.author === 'object' ? post.author.username : 'Unknown';
-  const imageUrl = post.image?.url;
+  const image = post.image?.url ? post.image : null;
 
   return (
     <div className="group flex flex-col gap-4 mb-8 break-inside-avoid">
       {/* Image Container */}
       <Link href={`/posts/${post.id}`} className="relative overflow-hidden rounded-xl bg-muted aspect-[4/3] w-full">
-        {imageUrl ? (
-          <img
-            src={imageUrl}
+        {image ? (
+          <PostImage
+            image={image}
             alt={post.title}
+            sizes="(min-width: 1024px) 33vw, (min-width: 768px) 50vw, 100vw"
             className="w-full h-full object-cover transition-transform duration-700 group-hover:scale-105"
           />
         ) : (
@@ -48,7 +50,7 @@ export function PostCard({ post }: PostCardProps) {
         </Link>
 
         <p className="text-sm text-muted-foreground leading-relaxed line-clamp-2 font-serif">
-          {post.body}
+          {post.excerpt ?? post.body}
         </p>
       </div>
     </div>
@@ -0,0 +1,31 @@
+import { Post } from "@/types";
+
+interface PostImageProps {
+  image: NonNullable<Post["image"]>;
+  alt: string;
+  // Which derivative to use as the fallback src; the browser picks from srcset using sizes
+  variant?: "thumb" | "card" | "full";
+  sizes: string;
+  className?: string;
+}
+
+export function PostImage({ image, alt, variant = "card", sizes, className }: PostImageProps) {
+  const chosen = image.variants?.[variant];
+  const src = chosen?.url || image.url;
+
+  return (
+    <img
+      src={src}
+      srcSet={image.srcset || undefined}
+      sizes={image.srcset ? sizes : undefined}
+      width={chosen?.width || image.width}
+      height={chosen?.height || image.height}
+      alt={alt}
+      loading="lazy"
+      decoding="async"
+      // blurred placeholder until the image paints over it
+      style={image.placeholder ? { backgroundImage: `url(${image.placeholder})`, backgroundSize: "cover" } : undefined}
+      className={className}
+    />
+  );
+}
@@ -4,23 +4,44 @@ export interface User {
     email: string;
 }
 
+export interface ImageVariant {
+    url: string;
+    width?: number;
+    height?: number;
+}
+
 export interface Post {
     id: string;
     title: string;
     body: string;
+    excerpt?: string;
+    reading_time?: number;
     author: { id: string; username: string } | string;
     created_at: string;
     tags?: string[];
     image?: {
-        url: string;
+        url?: string;
+        status?: 'pending' | 'ready' | 'failed';
         public_id?: string;
         width?: number;
         height?: number;
+        variants?: { thumb?: ImageVariant; card?: ImageVariant; full?: ImageVariant };
+        srcset?: string | null;
+        placeholder?: string | null;
     };
     likes_count?: number;
+    comments_count?: number;
     is_liked?: boolean;
 }
 
+export interface AuthorStats {
+    author_id: string;
+    posts_count: number;
+    likes_count: number;
+    comments_count: number;
+    last_post_at: string | null;
+}
+
 export interface AuthResponse {
     access_token: string;
     user: User;